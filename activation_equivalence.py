@@ -0,0 +1,238 @@
+"""Compare the populations of the staged (or compat) and the random activations.
+
+Both activations (see staged_activation.py) are run over the same seeds.
+The populations of each run are averaged over the steps following a burn-in
+period, and the two samples of averages are compared column by column with
+a paired two one-sided tests (TOST) procedure: the activations are
+equivalent on a population when the 90% confidence interval of the
+difference of the means lies within +/- margin times the mean of the random
+activation. A population
+which is zero in all the runs of both activations (e.g. the infections
+without the sickness) is reported as not tested.
+
+By default, the activations are compared without and with the sickness.
+
+Usage example:
+    python -m activation_equivalence --replicates 100 --steps 300 --margin 0.1
+
+The exit status is 1 when a population is not equivalent.
+"""
+import argparse
+import contextlib
+import io
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import batch_runner
+from population_series import POPULATION_COLUMNS
+from staged_activation import COMPAT_ACTIVATION, RANDOM_ACTIVATION, STAGED_ACTIVATION
+
+# pylint: disable=consider-using-f-string
+
+# one-sided 95% quantile of the normal distribution (90% confidence interval)
+Z_95 = 1.6449
+# values of add_sickness compared for each value of the --sickness option
+SICKNESS_SETTINGS = {"both": (False, True), "on": (True,), "off": (False,)}
+
+
+def run_activation(
+    activation: str, model_config: dict, nb_steps: int, seed: int
+) -> np.ndarray:
+    """Run the model with an activation (executed in a worker process).
+
+    Returns:
+        populations (np.ndarray): one row per step, one column per population
+    """
+    model_config = dict(model_config, activation=activation)
+    with contextlib.redirect_stdout(io.StringIO()):
+        population_series = batch_runner.run_simulation(model_config, nb_steps, seed)
+    return population_series.view().copy()
+
+
+def collect_time_averages(
+    activation: str,
+    model_config: dict,
+    nb_replicates: int,
+    nb_steps: int,
+    burn_in: int,
+    max_workers: Optional[int] = None,
+) -> np.ndarray:
+    """Average the populations of the replicates over the steps after burn_in.
+
+    Returns:
+        averages (np.ndarray): one row per replicate, one column per population
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run_activation, activation, model_config, nb_steps, seed)
+            for seed in range(nb_replicates)
+        ]
+        return np.array(
+            [future.result()[burn_in:].mean(axis=0) for future in futures]
+        )
+
+
+def equivalence_test(
+    reference: np.ndarray, candidate: np.ndarray, margin: float, paired: bool = True
+):
+    """Compare two samples of time averages with a TOST procedure.
+
+    Args:
+        reference (np.ndarray): averages of the random activation
+        candidate (np.ndarray): averages of the staged (or compat) activation
+        margin (float): equivalence bound, relative to the reference mean
+        paired (bool): the row i of both samples comes from runs of the seed i,
+            which draw the same random numbers (otherwise the samples are
+            compared as independent ones)
+
+    Returns:
+        results (list): for each population column, a dictionary with the
+            two means, the confidence interval of their difference, the
+            equivalence bound and whether the populations are equivalent
+            (None if the population is zero in all the runs of both samples)
+    """
+    results = []
+    for i, name in enumerate(POPULATION_COLUMNS):
+        reference_mean = reference[:, i].mean()
+        candidate_mean = candidate[:, i].mean()
+        difference = candidate_mean - reference_mean
+        if paired:
+            standard_error = np.std(
+                candidate[:, i] - reference[:, i], ddof=1
+            ) / np.sqrt(reference.shape[0])
+        else:
+            standard_error = np.sqrt(
+                np.var(reference[:, i], ddof=1) / reference.shape[0]
+                + np.var(candidate[:, i], ddof=1) / candidate.shape[0]
+            )
+        bound = margin * abs(reference_mean)
+        ci_low = difference - Z_95 * standard_error
+        ci_high = difference + Z_95 * standard_error
+        if reference[:, i].any() or candidate[:, i].any():
+            equivalent = bool(-bound <= ci_low and ci_high <= bound)
+        else:
+            # nothing to compare: "0 within +/-0" would not test anything
+            equivalent = None
+        results.append(
+            {
+                "population": name,
+                "reference_mean": reference_mean,
+                "candidate_mean": candidate_mean,
+                "ci_low": ci_low,
+                "ci_high": ci_high,
+                "bound": bound,
+                "equivalent": equivalent,
+            }
+        )
+    return results
+
+
+def print_results(results: list, reference_name: str, candidate_name: str) -> bool:
+    """Print the results of equivalence_test() and return True if all the
+    tested populations are equivalent (and at least one was tested)."""
+    verdicts = {True: "yes", False: "NO", None: "not tested"}
+    for result in results:
+        print(
+            "[Equivalence] {:<15} {} {:>8.1f}  {} {:>8.1f}  "
+            "90% CI of the difference [{:.1f}, {:.1f}] within +/-{:.1f}: {}".format(
+                result["population"],
+                reference_name,
+                result["reference_mean"],
+                candidate_name,
+                result["candidate_mean"],
+                result["ci_low"],
+                result["ci_high"],
+                result["bound"],
+                verdicts[result["equivalent"]],
+            )
+        )
+    equivalents = [result["equivalent"] for result in results]
+    return False not in equivalents and True in equivalents
+
+
+def compare_activations(
+    model_config: dict,
+    activation: str,
+    nb_replicates: int,
+    nb_steps: int,
+    burn_in: int,
+    margin: float,
+    max_workers: Optional[int] = None,
+) -> list:
+    """Run the random activation and another one over the same seeds.
+
+    Returns:
+        results (list): the comparison of the populations (see equivalence_test())
+    """
+    averages = [
+        collect_time_averages(
+            compared_activation,
+            model_config,
+            nb_replicates,
+            nb_steps,
+            burn_in,
+            max_workers,
+        )
+        for compared_activation in (RANDOM_ACTIVATION, activation)
+    ]
+    return equivalence_test(*averages, margin)
+
+
+def main(argv: Optional[list] = None):
+    """Entry point of the equivalence test."""
+    parser = argparse.ArgumentParser(
+        description="Compare the staged and the random activations of the model."
+    )
+    parser.add_argument(
+        "--activation",
+        choices=(STAGED_ACTIVATION, COMPAT_ACTIVATION),
+        default=STAGED_ACTIVATION,
+        help="activation compared with the random one",
+    )
+    parser.add_argument(
+        "--sickness",
+        choices=sorted(SICKNESS_SETTINGS),
+        default="both",
+        help="compare the activations with the sickness, without it, or both",
+    )
+    parser.add_argument("--replicates", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument(
+        "--burn-in", type=int, default=50, help="first steps left out of the averages"
+    )
+    parser.add_argument(
+        "--margin",
+        type=float,
+        default=0.1,
+        help="equivalence bound, relative to the mean of the random activation",
+    )
+    parser.add_argument(
+        "--config", type=Path, default=None, help="JSON file of model parameters"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.burn_in >= args.steps:
+        parser.error("--burn-in must be smaller than --steps")
+    model_config = batch_runner.load_model_config(args.config)
+    all_equivalent = True
+    for add_sickness in SICKNESS_SETTINGS[args.sickness]:
+        print("[Equivalence] Sickness added: {}".format(add_sickness))
+        results = compare_activations(
+            dict(model_config, add_sickness=add_sickness),
+            args.activation,
+            args.replicates,
+            args.steps,
+            args.burn_in,
+            args.margin,
+            args.workers,
+        )
+        if not print_results(results, RANDOM_ACTIVATION, args.activation):
+            all_equivalent = False
+    if not all_equivalent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""Array-backed population backend for the Preys-Predators model.
+
+Instead of one mesa.Agent object per animal, each species is stored as
+columns of NumPy arrays (position, energy, sick flag, alive flag) with a
+free-list of slots for births and deaths. The moves, meals, deaths and
+births of a whole species are then computed with a few array operations per
+step, following the same rules as Sheep.step and Wolf.step:
+
+- a sheep moves, updates its sickness, may die, eats grass and may reproduce,
+- a wolf moves, may die, eats a sheep sharing its cell and may reproduce,
+- an animal which dies during its step still eats and reproduces in that step,
+  as in the agent-based model where die() only registers the death,
+- newborns appear on the cell of their parent at the end of the step.
+
+The agents of the mesa model are activated in a random order; here the two
+species are processed one after the other, in a random order at each step.
+"""
+from typing import Optional
+import mesa
+import numpy as np
+from sheep_wolves_grass import GrassField, MOORE_OFFSETS
+from population_series import PopulationSeries
+from simulation_config import ModelConfig
+
+# Offsets of the eight cells of the Moore neighbourhood
+MOORE_OFFSETS_X = np.array([offset_x for offset_x, _ in MOORE_OFFSETS])
+MOORE_OFFSETS_Y = np.array([offset_y for _, offset_y in MOORE_OFFSETS])
+
+
+class SpeciesArrays:
+    """Store the animals of one species as columns of arrays.
+
+    The slot i of every column describes the same animal. Slots of dead
+    animals go back to a free-list and are reused by the next births.
+    """
+
+    # names of the columns, which grow() enlarges
+    COLUMNS = ("unique_id", "pos_x", "pos_y", "energy", "is_sick", "alive")
+
+    def __init__(self, capacity: int = 64):
+        self.unique_id = np.zeros(capacity, dtype=np.int64)
+        self.pos_x = np.zeros(capacity, dtype=np.int64)
+        self.pos_y = np.zeros(capacity, dtype=np.int64)
+        self.energy = np.zeros(capacity, dtype=np.float64)
+        self.is_sick = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # free slots, the next one to be used is at the end
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.nb_alive = 0
+
+    @property
+    def capacity(self) -> int:
+        """Number of slots of the columns."""
+        return self.alive.shape[0]
+
+    def grow(self, min_capacity: int):
+        """Enlarge the columns so that they hold at least min_capacity slots."""
+        old_capacity = self.capacity
+        new_capacity = max(2 * old_capacity, min_capacity)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            new_column = np.zeros(new_capacity, dtype=column.dtype)
+            new_column[:old_capacity] = column
+            setattr(self, name, new_column)
+        # keep the lowest slots at the end of the free-list
+        self.free_slots[:0] = range(new_capacity - 1, old_capacity - 1, -1)
+
+    def add(
+        self,
+        unique_id: np.ndarray,
+        pos_x: np.ndarray,
+        pos_y: np.ndarray,
+        energy,
+        is_sick: np.ndarray,
+    ) -> np.ndarray:
+        """Add animals in free slots.
+
+        Returns:
+            slots (np.ndarray): the slots of the new animals
+        """
+        nb_new = unique_id.shape[0]
+        if nb_new > len(self.free_slots):
+            self.grow(self.nb_alive + nb_new)
+        slots = np.array(
+            self.free_slots[len(self.free_slots) - nb_new :][::-1], dtype=np.int64
+        )
+        del self.free_slots[len(self.free_slots) - nb_new :]
+        self.unique_id[slots] = unique_id
+        self.pos_x[slots] = pos_x
+        self.pos_y[slots] = pos_y
+        self.energy[slots] = energy
+        self.is_sick[slots] = is_sick
+        self.alive[slots] = True
+        self.nb_alive += nb_new
+        return slots
+
+    def remove(self, slots: np.ndarray):
+        """Remove the animals of some slots (they must be alive)."""
+        self.alive[slots] = False
+        self.free_slots.extend(slots[::-1].tolist())
+        self.nb_alive -= slots.shape[0]
+
+    def alive_slots(self) -> np.ndarray:
+        """Return the slots of the living animals."""
+        return np.flatnonzero(self.alive)
+
+
+def rank_within_cells(cells: np.ndarray) -> np.ndarray:
+    """Rank each element among the elements of the same cell.
+
+    Args:
+        cells (np.ndarray): the flat cell index of each element
+
+    Returns:
+        ranks (np.ndarray): ranks[i] is the number of elements before i which
+            are in the same cell as i
+    """
+    order = np.argsort(cells, kind="stable")
+    sorted_cells = cells[order]
+    new_group = np.ones(sorted_cells.shape[0], dtype=bool)
+    new_group[1:] = sorted_cells[1:] != sorted_cells[:-1]
+    group_starts = np.flatnonzero(new_group)
+    group_ids = np.cumsum(new_group) - 1
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(order.shape[0]) - group_starts[group_ids]
+    return ranks
+
+
+class ArrayPreysPredatorsModel(mesa.Model):
+    """Preys-Predators model whose animals are stored in arrays.
+
+    It exposes the same interface as PreysPredatorsModel: step(), config,
+    grass_field, running, collect_population() and population_series.
+    """
+
+    def __init__(
+        self,
+        config,
+        seed: Optional[int] = None,
+        population_series: Optional[PopulationSeries] = None,
+    ):
+        super().__init__()
+        if seed is not None:
+            self.reset_randomizer(seed)
+        self.config = ModelConfig.coerce(config)
+        self.rng = np.random.default_rng(seed)
+        self.width = self.config.grid_width
+        self.height = self.config.grid_height
+        self.grass_field = self.create_grass_field()
+        self.sheeps = self.create_species_arrays()
+        self.wolves = self.create_species_arrays()
+        # birth_places() of the parents of the animals to be born at the end of the step
+        self.born_sheeps = []
+        self.born_wolves = []
+        # number of infections and cures since the last population collection
+        self.nb_infections = 0
+        self.nb_cures = 0
+        self.population_series = (
+            PopulationSeries() if population_series is None else population_series
+        )
+        self.running = False
+        self.init_all_agents()
+
+    def create_grass_field(self) -> GrassField:
+        """Create the grass patches of the grid."""
+        return GrassField(self.width, self.height, self.config.grass_regrowth_time)
+
+    def create_species_arrays(self) -> SpeciesArrays:
+        """Create the empty columns of a species."""
+        return SpeciesArrays()
+
+    def next_ids(self, nb_ids: int) -> np.ndarray:
+        """Return nb_ids new unique IDs."""
+        unique_ids = np.arange(self.current_id + 1, self.current_id + nb_ids + 1)
+        self.current_id += nb_ids
+        return unique_ids
+
+    def add_sheeps(self, pos_x: np.ndarray, pos_y: np.ndarray):
+        """Create sheeps on the given cells."""
+        nb_sheeps = pos_x.shape[0]
+        is_sick = self.rng.random(nb_sheeps) > self.config.sheep_sanity_proba
+        self.sheeps.add(
+            self.next_ids(nb_sheeps),
+            pos_x,
+            pos_y,
+            self.config.sheep_init_energy,
+            is_sick,
+        )
+
+    def add_wolves(self, pos_x: np.ndarray, pos_y: np.ndarray):
+        """Create wolves on the given cells."""
+        nb_wolves = pos_x.shape[0]
+        self.wolves.add(
+            self.next_ids(nb_wolves),
+            pos_x,
+            pos_y,
+            self.config.wolf_init_energy,
+            np.zeros(nb_wolves, dtype=bool),
+        )
+
+    def init_all_agents(self):
+        """Create the initial population."""
+        nb_sheeps = self.config.init_nb_sheeps
+        self.add_sheeps(
+            self.rng.integers(self.width, size=nb_sheeps),
+            self.rng.integers(self.height, size=nb_sheeps),
+        )
+        nb_wolves = self.config.init_nb_wolves
+        self.add_wolves(
+            self.rng.integers(self.width, size=nb_wolves),
+            self.rng.integers(self.height, size=nb_wolves),
+        )
+
+    def cells(self, species: SpeciesArrays, slots: np.ndarray) -> np.ndarray:
+        """Flat index of the cells of some animals."""
+        return species.pos_x[slots] * self.height + species.pos_y[slots]
+
+    def move(self, species: SpeciesArrays, slots: np.ndarray, move_loss):
+        """Move animals to a random neighbouring cell of the torus."""
+        directions = self.rng.integers(len(MOORE_OFFSETS_X), size=slots.shape[0])
+        species.pos_x[slots] = (
+            species.pos_x[slots] + MOORE_OFFSETS_X[directions]
+        ) % self.width
+        species.pos_y[slots] = (
+            species.pos_y[slots] + MOORE_OFFSETS_Y[directions]
+        ) % self.height
+        species.energy[slots] -= move_loss
+
+    def reproduce(
+        self, species: SpeciesArrays, slots: np.ndarray, rate: float, born: list
+    ):
+        """Queue the births of the animals which reproduce."""
+        parents = slots[self.rng.random(slots.shape[0]) < rate]
+        born.append(self.birth_places(species, parents))
+
+    def birth_places(self, species: SpeciesArrays, parents: np.ndarray) -> tuple:
+        """Return the columns of the parents which locate their newborns."""
+        return species.pos_x[parents], species.pos_y[parents]
+
+    def record_sickness_changes(self, cured: np.ndarray, infected: np.ndarray):
+        """Count the sheeps cured and infected, given by their slots."""
+        self.nb_cures += cured.shape[0]
+        self.nb_infections += infected.shape[0]
+
+    def update_sickness(self, slots: np.ndarray):
+        """Cure and infect sheeps (see Sheep.update_sickness)."""
+        sheeps = self.sheeps
+        cured = sheeps.is_sick[slots] & (
+            self.rng.random(slots.shape[0]) < self.config.sheep_cure_proba
+        )
+        sheeps.is_sick[slots[cured]] = False
+        # number of sick sheeps on each cell
+        sick_slots = np.flatnonzero(sheeps.alive & sheeps.is_sick)
+        nb_sick_per_cell = np.bincount(
+            self.cells(sheeps, sick_slots), minlength=self.grass_field.grass.size
+        )
+        healthy = slots[~sheeps.is_sick[slots]]
+        infected = (nb_sick_per_cell[self.cells(sheeps, healthy)] > 0) & (
+            self.rng.random(healthy.shape[0])
+            < self.config.proba_sickness_transmission
+        )
+        sheeps.is_sick[healthy[infected]] = True
+        self.record_sickness_changes(slots[cured], healthy[infected])
+
+    def step_sheeps(self, slots: Optional[np.ndarray] = None):
+        """Run Sheep.step for some living sheeps (all of them by default)."""
+        sheeps = self.sheeps
+        if slots is None:
+            slots = sheeps.alive_slots()
+        self.move(sheeps, slots, self.config.sheep_move_loss)
+        if self.config.add_sickness:
+            self.update_sickness(slots)
+        dead = sheeps.energy[slots] < 0
+        if self.config.add_sickness:
+            dead |= sheeps.is_sick[slots] & (
+                self.rng.random(slots.shape[0]) < self.config.sickness_severity
+            )
+        # at most one sheep eats the grass of a cell
+        eaters = self.rng.permutation(slots)
+        eater_cells = self.cells(sheeps, eaters)
+        has_grass = self.grass_field.grass.reshape(-1)[eater_cells]
+        eaters, eater_cells = eaters[has_grass], eater_cells[has_grass]
+        eater_cells, first_eaters = np.unique(eater_cells, return_index=True)
+        self.grass_field.eat_cells(eater_cells)
+        sheeps.energy[eaters[first_eaters]] += self.config.sheep_gain_from_grass
+        self.reproduce(
+            sheeps, slots, self.config.sheep_reproduction_rate, self.born_sheeps
+        )
+        sheeps.remove(slots[dead])
+
+    def step_wolves(self, slots: Optional[np.ndarray] = None):
+        """Run Wolf.step for some living wolves (all of them by default)."""
+        wolves = self.wolves
+        sheeps = self.sheeps
+        if slots is None:
+            slots = wolves.alive_slots()
+        self.move(wolves, slots, self.config.wolf_move_loss)
+        dead = wolves.energy[slots] < 0
+        # the k-th wolf of a cell eats the k-th living sheep of the cell
+        hunters = self.rng.permutation(slots)
+        preys = self.rng.permutation(sheeps.alive_slots())
+        hunter_cells = self.cells(wolves, hunters)
+        prey_cells = self.cells(sheeps, preys)
+        # only the cells holding both species need to be ranked
+        nb_cells = self.grass_field.grass.size
+        shared_cells = (np.bincount(hunter_cells, minlength=nb_cells) > 0) & (
+            np.bincount(prey_cells, minlength=nb_cells) > 0
+        )
+        in_shared_cells = shared_cells[hunter_cells]
+        hunters, hunter_cells = hunters[in_shared_cells], hunter_cells[in_shared_cells]
+        in_shared_cells = shared_cells[prey_cells]
+        preys, prey_cells = preys[in_shared_cells], prey_cells[in_shared_cells]
+        max_rank = max(hunters.shape[0], preys.shape[0]) + 1
+        _, hunter_idx, prey_idx = np.intersect1d(
+            hunter_cells * max_rank + rank_within_cells(hunter_cells),
+            prey_cells * max_rank + rank_within_cells(prey_cells),
+            assume_unique=True,
+            return_indices=True,
+        )
+        wolves.energy[hunters[hunter_idx]] += self.config.wolf_gain_from_sheep
+        sheeps.remove(preys[prey_idx])
+        self.reproduce(
+            wolves, slots, self.config.wolf_reproduction_rate, self.born_wolves
+        )
+        wolves.remove(slots[dead])
+
+    def give_birth_to_agents(self):
+        """Create the animals born during the step."""
+        for born, add_species in (
+            (self.born_sheeps, self.add_sheeps),
+            (self.born_wolves, self.add_wolves),
+        ):
+            if born:
+                add_species(*(np.concatenate(column) for column in zip(*born)))
+                born.clear()
+
+    def animal_cells(self) -> tuple:
+        """Locate the animals on the grid (see PreysPredatorsModel.animal_cells)."""
+        sheep_slots = self.sheeps.alive_slots()
+        return (
+            self.cells(self.sheeps, sheep_slots),
+            self.sheeps.is_sick[sheep_slots],
+            self.cells(self.wolves, self.wolves.alive_slots()),
+        )
+
+    def collect_population(self):
+        """Append the current populations and the sickness changes since the
+        previous collection to the population series."""
+        self.population_series.append(
+            (*compute_population_arrays(self), self.nb_infections, self.nb_cures)
+        )
+        self.nb_infections = 0
+        self.nb_cures = 0
+
+    def step(self):
+        """Handle a generic step for the whole model."""
+        self.collect_population()
+        if self.rng.random() < 0.5:
+            self.step_sheeps()
+            self.step_wolves()
+        else:
+            self.step_wolves()
+            self.step_sheeps()
+        self.grass_field.step()
+        self.give_birth_to_agents()
+
+
+def compute_population_arrays(model: ArrayPreysPredatorsModel):
+    """Count the number of sheeps, wolves and grass on the grid."""
+    sheeps = model.sheeps
+    count_sick = int(np.count_nonzero(sheeps.alive & sheeps.is_sick))
+    return (
+        sheeps.nb_alive,
+        model.wolves.nb_alive,
+        model.grass_field.count_grass(),
+        count_sick,
+    )
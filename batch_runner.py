@@ -0,0 +1,262 @@
+"""Run the simulation without the GUI and save the populations to disk.
+
+Usage example:
+    python -m batch_runner --steps 1000 --init-nb-sheeps 150 --output populations.csv
+
+The populations are flushed to the output file by chunks of --chunk-size steps,
+so the memory used does not grow with the number of steps. The output can be a
+.csv, .npz or .parquet file.
+"""
+import argparse
+import importlib
+from pathlib import Path
+from typing import Optional
+import simulation_config as config
+from population_series import PopulationSeries, POPULATION_COLUMNS as SERIES_COLUMNS
+
+# pylint: disable=consider-using-f-string
+
+POPULATION_COLUMNS = ["step", *SERIES_COLUMNS]
+# Ways of storing the animals: one mesa agent each, columns of arrays, mesa
+# agents split between worker processes by tiles of the grid, or columns of
+# arrays stepped animal by animal in compiled loops. The model classes are
+# given as "module:class" and only imported when used (see get_backend()), so
+# that a run does not pay for the imports of the other backends (e.g. numba).
+MODEL_BACKENDS = {
+    "agents": "sheep_wolves_grass:PreysPredatorsModel",
+    "arrays": "array_population:ArrayPreysPredatorsModel",
+    "tiles": "domain_decomposition:TiledPreysPredatorsModel",
+    "compiled": "compiled_population:CompiledPreysPredatorsModel",
+}
+
+
+def get_backend(backend: str) -> type:
+    """Import and return the model class of a backend, a key of MODEL_BACKENDS."""
+    module_name, class_name = MODEL_BACKENDS[backend].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def parse_bool(value: str) -> bool:
+    """Convert a command line string to a boolean (see config.parse_bool_string)."""
+    try:
+        return config.parse_bool_string(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from error
+
+
+def config_value_parser(key: str):
+    """Return the argparse type of a model parameter.
+
+    The string is converted and checked as in the environment and the config
+    files, so an invalid value is reported as a command line error.
+    """
+
+    def parse_value(value: str):
+        try:
+            value = config.parse_config_string(key, value)
+            if config.MODEL_CONFIG_FIELDS[key] in config.CONFIG_CHOICES:
+                # checked by the choices of the option, with a clearer message
+                return value
+            return config.check_config_value(key, value)
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(str(error)) from error
+
+    return parse_value
+
+
+def load_model_config(
+    config_path: Optional[Path] = None, overrides: Optional[dict] = None
+) -> dict:
+    """Build a model configuration.
+
+    The default configuration is updated with the content of the JSON or TOML
+    file config_path, then with the overrides.
+
+    Args:
+        config_path (Path): path to a JSON or TOML file with some model parameters
+        overrides (dict): model parameters which take precedence over the file
+
+    Returns:
+        model_config (dict): the configuration of the model
+
+    Raises:
+        ModelConfigError: if a parameter is unknown or has an invalid value
+    """
+    model_config = config.create_model_default_config()
+    if config_path is not None:
+        model_config.update(config.read_config_file(config_path))
+    if overrides:
+        model_config.update(overrides)
+    return config.ModelConfig(**model_config).as_dict()
+
+
+def run_simulation(
+    model_config: dict,
+    nb_steps: int,
+    seed: Optional[int] = None,
+    trace_path: Optional[Path] = None,
+    backend: str = "agents",
+    population_series: Optional[PopulationSeries] = None,
+    profile_path: Optional[Path] = None,
+    nb_tiles: Optional[int] = None,
+) -> PopulationSeries:
+    """Run a model for a given number of steps.
+
+    Args:
+        model_config (dict): the configuration of the model
+        nb_steps (int): the number of steps to run
+        seed (int): seed of the model random number generator
+        trace_path (Path): JSON lines file where to record the events of the run
+            (only supported by the "agents" backend)
+        backend (str): the population backend, a key of MODEL_BACKENDS
+        population_series (PopulationSeries): where to store the populations
+            (a new in-memory series if not given)
+        profile_path (Path): file where to write the time spent in each phase
+            of the steps, as folded stacks (only supported by the "agents" backend)
+        nb_tiles (int): number of worker processes of the "tiles" backend (one
+            per CPU by default)
+
+    Returns:
+        population_series (PopulationSeries): the populations from the initial
+            step to the last one
+    """
+    model_kwargs = {"seed": seed, "population_series": population_series}
+    if trace_path is not None:
+        model_kwargs["trace_path"] = trace_path
+    if profile_path is not None:
+        model_kwargs["profile"] = True
+    if backend == "tiles":
+        model_kwargs["nb_tiles"] = nb_tiles
+    model = get_backend(backend)(model_config, **model_kwargs)
+    completed = False
+    try:
+        model.running = True
+        for _ in range(nb_steps):
+            model.step()
+        if profile_path is not None:
+            model.profiler.write_folded(profile_path)
+            for name, (seconds, calls) in model.profiler.totals().items():
+                print(
+                    "[Profile] {:<45} {:>10.3f} s {:>10} calls".format(
+                        name, seconds, calls
+                    )
+                )
+        # collect the state reached after the last step
+        model.collect_population()
+        completed = True
+    finally:
+        # the events recorded before a failure are kept
+        if trace_path is not None:
+            model.tracer.close()
+        if backend == "tiles":
+            # after an error (or Ctrl-C), the workers may never read a request
+            model.close(terminate=not completed)
+    return model.population_series
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """Create the command line parser.
+
+    One option is created for each parameter of the default model configuration.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run the preys-predators model without the GUI."
+    )
+    parser.add_argument(
+        "--steps", type=int, default=100, help="number of steps to run"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="seed of the random number generator"
+    )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=None,
+        help="JSON or TOML file of model parameters",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("populations.csv"),
+        help="CSV, NPZ or Parquet file where to write the populations",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="number of steps kept in memory before flushing them to the output",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=sorted(MODEL_BACKENDS),
+        default="agents",
+        help="store the animals as mesa agents, as columns of arrays, as mesa "
+        "agents split by tiles between worker processes, or as columns of arrays "
+        "stepped in compiled loops (with numba if installed)",
+    )
+    parser.add_argument(
+        "--tiles",
+        type=int,
+        default=None,
+        help="number of worker processes of the tiles backend (one per CPU by default)",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="JSON lines file where to record births, deaths, meals and infections",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        help="file where to write the time spent in each phase (folded stacks)",
+    )
+    model_parameters = parser.add_argument_group("model parameters")
+    for key, value in config.create_model_default_config().items():
+        model_parameters.add_argument(
+            "--" + key.replace("_", "-"),
+            dest=key,
+            type=config_value_parser(key),
+            choices=config.CONFIG_CHOICES.get(config.MODEL_CONFIG_FIELDS[key]),
+            default=None,
+            help="default: {}".format(value),
+        )
+    return parser
+
+
+def main(argv: Optional[list] = None):
+    """Entry point of the batch runner."""
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    if args.trace is not None and args.backend != "agents":
+        parser.error("--trace is only supported by the agents backend")
+    if args.profile is not None and args.backend != "agents":
+        parser.error("--profile is only supported by the agents backend")
+    if args.tiles is not None and args.backend != "tiles":
+        parser.error("--tiles is only supported by the tiles backend")
+    overrides = {
+        key: value
+        for key, value in vars(args).items()
+        if key in config.create_model_default_config() and value is not None
+    }
+    model_config = load_model_config(args.config, overrides)
+    population_series = PopulationSeries(
+        flush_path=args.output, chunk_size=args.chunk_size
+    )
+    run_simulation(
+        model_config,
+        args.steps,
+        args.seed,
+        args.trace,
+        args.backend,
+        population_series,
+        args.profile,
+        args.tiles,
+    )
+    population_series.close()
+    print("[Batch] {} steps written to {}".format(args.steps, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Measure how the step of the model scales with the grid and the populations.
+
+The model is run headless over every combination of the grid sizes, the
+initial populations and the sickness switch. For each case, the benchmark
+reports the steps per second, the time spent in each phase of the step and
+the peak memory allocated, and writes the results to a JSON file.
+
+Usage example:
+    python -m benchmark --steps 100 --output bench.json
+    python -m benchmark --steps 100 --output new.json --baseline bench.json
+
+With --baseline, the run fails (exit status 1) when a case is slower than in
+the baseline file by more than --threshold (10% by default).
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional
+import mesa
+import numpy as np
+from sheep_wolves_grass import PreysPredatorsModel
+import batch_runner
+
+# pylint: disable=consider-using-f-string
+
+DEFAULT_GRID_SIZES = ["20x20", "50x50", "100x100"]
+DEFAULT_POPULATIONS = ["100:25", "400:100", "1600:400"]
+DEFAULT_SICKNESS = [False, True]
+
+
+def parse_grid_size(value: str) -> tuple:
+    """Convert a WIDTHxHEIGHT command line string to a tuple."""
+    try:
+        width, height = (int(size) for size in value.lower().split("x"))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            "Expected a grid size such as 50x50, got '{}'.".format(value)
+        ) from error
+    return width, height
+
+
+def parse_population(value: str) -> tuple:
+    """Convert a SHEEPS:WOLVES command line string to a tuple."""
+    try:
+        nb_sheeps, nb_wolves = (int(size) for size in value.split(":"))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            "Expected a population such as 400:100, got '{}'.".format(value)
+        ) from error
+    return nb_sheeps, nb_wolves
+
+
+def build_cases(grid_sizes: list, populations: list, sickness: list) -> list:
+    """List the model configurations of the benchmark matrix.
+
+    Returns:
+        cases (list): one dictionary of model parameters per case
+    """
+    cases = []
+    for (width, height), (nb_sheeps, nb_wolves), add_sickness in itertools.product(
+        grid_sizes, populations, sickness
+    ):
+        cases.append(
+            {
+                "grid_width": width,
+                "grid_height": height,
+                "init_nb_sheeps": nb_sheeps,
+                "init_nb_wolves": nb_wolves,
+                "add_sickness": add_sickness,
+            }
+        )
+    return cases
+
+
+def case_name(case: dict) -> str:
+    """Name of a case, which identifies it across benchmark files."""
+    return "{}x{}-sheeps{}-wolves{}-sickness{}".format(
+        case["grid_width"],
+        case["grid_height"],
+        case["init_nb_sheeps"],
+        case["init_nb_wolves"],
+        "On" if case["add_sickness"] else "Off",
+    )
+
+
+def create_model(case: dict, seed: int) -> PreysPredatorsModel:
+    """Create the model of a case, without its report on stdout."""
+    model_config = batch_runner.load_model_config(overrides=case)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = PreysPredatorsModel(model_config, seed=seed)
+    model.running = True
+    return model
+
+
+def timed_step(model: PreysPredatorsModel, phase_times: dict):
+    """Run one step of the model and add the duration of each phase."""
+    for phase in model.step_phases():
+        start = time.perf_counter()
+        phase()
+        phase_times[phase.__qualname__] += time.perf_counter() - start
+
+
+def measure_peak_memory(case: dict, nb_steps: int, seed: int) -> int:
+    """Run a case again under tracemalloc and return its peak allocation in bytes.
+
+    This is a separate run since tracemalloc slows the model down.
+    """
+    tracemalloc.start()
+    try:
+        model = create_model(case, seed)
+        for _ in range(nb_steps):
+            model.step()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_case(
+    case: dict, nb_steps: int, seed: int, repeat: int = 1, memory: bool = True
+) -> dict:
+    """Benchmark a case.
+
+    Args:
+        case (dict): the model parameters of the case
+        nb_steps (int): the number of steps of each run
+        seed (int): seed of the model random number generator
+        repeat (int): number of timed runs, the fastest one is kept
+        memory (bool): also measure the peak memory (one more run)
+
+    Returns:
+        result (dict): the case, the steps per second, the seconds spent in
+            each phase and the peak memory in MiB (None if not measured)
+    """
+    best_phase_times = None
+    for _ in range(repeat):
+        model = create_model(case, seed)
+        phase_times = {phase.__qualname__: 0.0 for phase in model.step_phases()}
+        for _ in range(nb_steps):
+            timed_step(model, phase_times)
+        if best_phase_times is None or sum(phase_times.values()) < sum(
+            best_phase_times.values()
+        ):
+            best_phase_times = phase_times
+    total_time = sum(best_phase_times.values())
+    peak_memory_mib = None
+    if memory:
+        peak_memory_mib = measure_peak_memory(case, nb_steps, seed) / 2**20
+    return {
+        "name": case_name(case),
+        "case": case,
+        "steps_per_second": nb_steps / total_time if total_time else float("inf"),
+        "phase_seconds": best_phase_times,
+        "peak_memory_mib": peak_memory_mib,
+        "final_population": model.population_series.view()[-1].tolist(),
+    }
+
+
+def run_benchmark(
+    cases: list, nb_steps: int, seed: int = 0, repeat: int = 1, memory: bool = True
+) -> dict:
+    """Benchmark all the cases and describe the environment of the run."""
+    results = []
+    for case in cases:
+        result = run_case(case, nb_steps, seed, repeat, memory)
+        print(
+            "[Benchmark] {:<40} {:>10.1f} steps/s".format(
+                result["name"], result["steps_per_second"]
+            )
+        )
+        results.append(result)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "mesa": mesa.__version__,
+        },
+        "nb_steps": nb_steps,
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def find_regressions(report: dict, baseline: dict, threshold: float) -> list:
+    """Compare the throughput of the cases found in both benchmark reports.
+
+    Args:
+        report (dict): the current benchmark report
+        baseline (dict): the reference benchmark report
+        threshold (float): tolerated relative slowdown, e.g. 0.1 for 10%
+
+    Returns:
+        regressions (list): (name, baseline steps/s, current steps/s) of the
+            cases slower than the baseline by more than the threshold
+    """
+    baseline_speeds = {
+        result["name"]: result["steps_per_second"] for result in baseline["results"]
+    }
+    regressions = []
+    for result in report["results"]:
+        baseline_speed = baseline_speeds.get(result["name"])
+        if baseline_speed is None:
+            continue
+        if result["steps_per_second"] < baseline_speed * (1 - threshold):
+            regressions.append(
+                (result["name"], baseline_speed, result["steps_per_second"])
+            )
+    return regressions
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """Create the command line parser."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the step of the preys-predators model."
+    )
+    parser.add_argument("--steps", type=int, default=100, help="steps per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="timed runs per case, the best is kept"
+    )
+    parser.add_argument(
+        "--grid-sizes",
+        nargs="+",
+        type=parse_grid_size,
+        default=[parse_grid_size(size) for size in DEFAULT_GRID_SIZES],
+        metavar="WIDTHxHEIGHT",
+    )
+    parser.add_argument(
+        "--populations",
+        nargs="+",
+        type=parse_population,
+        default=[parse_population(size) for size in DEFAULT_POPULATIONS],
+        metavar="SHEEPS:WOLVES",
+    )
+    parser.add_argument(
+        "--sickness",
+        nargs="+",
+        type=batch_runner.parse_bool,
+        default=DEFAULT_SICKNESS,
+        help="values of add_sickness to benchmark",
+    )
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="skip the peak memory measurement",
+    )
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmark.json"), help="JSON report"
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=None, help="JSON report to compare with"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="tolerated slowdown relative to the baseline",
+    )
+    return parser
+
+
+def main(argv: Optional[list] = None):
+    """Entry point of the benchmark."""
+    args = create_parser().parse_args(argv)
+    cases = build_cases(args.grid_sizes, args.populations, args.sickness)
+    report = run_benchmark(cases, args.steps, args.seed, args.repeat, args.memory)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print("[Benchmark] Report written to {}".format(args.output))
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = find_regressions(report, baseline, args.threshold)
+        for name, baseline_speed, speed in regressions:
+            print(
+                "[Benchmark] Regression on {}: {:.1f} -> {:.1f} steps/s".format(
+                    name, baseline_speed, speed
+                )
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
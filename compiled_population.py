@@ -0,0 +1,550 @@
+"""Compiled population backend for the Preys-Predators model.
+
+The rules of Sheep.step and Wolf.step are sequential: a sheep eats the grass
+of its cell only if no sheep ate it before in the step, and a wolf eats the
+first live sheep which entered its cell. Instead of approximating them with
+array operations (see array_population.py), this backend runs the steps of
+the animals one after the other, in a random order as with
+mesa.time.RandomActivation, in loops over arrays which numba compiles to
+machine code. The compiled kernels are cached on disk (in __pycache__, or in
+NUMBA_CACHE_DIR), so they are only compiled on the first run. numba itself
+is only imported when the first model is created, so importing this module
+stays cheap.
+
+numba is optional: without it, the same kernels run as plain Python loops
+over the NumPy arrays. They give the same populations, only much slower.
+
+The random numbers of a step are drawn in bulk before the kernels run (as
+with StepDraws), so a seed gives the same run with and without numba.
+"""
+import functools
+from typing import Optional
+import mesa
+import numpy as np
+from sheep_wolves_grass import GrassField, MOORE_OFFSETS
+from population_series import PopulationSeries
+from simulation_config import ModelConfig
+
+SHEEP = 0
+WOLF = 1
+# rows of the random numbers drawn for each animal at each step
+DRAW_MOVE, DRAW_REPRODUCE, DRAW_CURE, DRAW_INFECTION, DRAW_SICKNESS_DEATH = range(5)
+NB_DRAWS = 5
+# marks the end of a list of sheeps in a cell
+NO_SLOT = -1
+MOORE_OFFSETS_ARRAY = np.array(MOORE_OFFSETS, dtype=np.int64)
+
+
+def import_numba():
+    """Import numba, which is only required to compile the kernels."""
+    try:
+        import numba  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return numba
+
+
+# names of the kernels, compiled by compile_kernels()
+KERNELS = []
+
+
+def jit(function):
+    """Register a kernel, which compile_kernels() compiles with numba."""
+    KERNELS.append(function.__name__)
+    return function
+
+
+@functools.lru_cache(maxsize=None)
+def compile_kernels():
+    """Compile the kernels with numba, cached on disk, if numba is installed.
+
+    The kernels of the module are replaced by their numba dispatchers, which
+    the kernels calling other kernels resolve when they are compiled (at their
+    first call). Only the first call does anything.
+
+    Returns:
+        numba (module): the numba module, None if it is not installed
+    """
+    numba = import_numba()
+    if numba is not None:
+        for name in KERNELS:
+            globals()[name] = numba.njit(cache=True)(globals()[name])
+    return numba
+
+
+@jit
+def random_neighbour(pos_x, pos_y, draw, width, height, offsets):
+    """Return the neighbour of a cell selected by a draw in [0, 1).
+
+    As PreysPredatorsModel.random_neighbour(), including the grids narrower
+    than 3 cells where the neighbours reached twice are only counted once.
+    """
+    if width >= 3 and height >= 3:
+        offset = int(draw * 8)
+        return (
+            (pos_x + offsets[offset, 0]) % width,
+            (pos_y + offsets[offset, 1]) % height,
+        )
+    neighbours = np.empty((8, 2), dtype=np.int64)
+    nb_neighbours = 0
+    for offset in range(8):
+        neighbour_x = (pos_x + offsets[offset, 0]) % width
+        neighbour_y = (pos_y + offsets[offset, 1]) % height
+        if neighbour_x == pos_x and neighbour_y == pos_y:
+            continue
+        duplicate = False
+        for i in range(nb_neighbours):
+            if neighbours[i, 0] == neighbour_x and neighbours[i, 1] == neighbour_y:
+                duplicate = True
+        if not duplicate:
+            neighbours[nb_neighbours, 0] = neighbour_x
+            neighbours[nb_neighbours, 1] = neighbour_y
+            nb_neighbours += 1
+    selected = int(draw * nb_neighbours)
+    return neighbours[selected, 0], neighbours[selected, 1]
+
+
+@jit
+def link_sheep(slot, cell, next_sheep, previous_sheep, first_sheep, last_sheep):
+    """Append a live sheep to the sheeps of a cell."""
+    next_sheep[slot] = NO_SLOT
+    previous_sheep[slot] = last_sheep[cell]
+    if last_sheep[cell] == NO_SLOT:
+        first_sheep[cell] = slot
+    else:
+        next_sheep[last_sheep[cell]] = slot
+    last_sheep[cell] = slot
+
+
+@jit
+def unlink_sheep(slot, cell, next_sheep, previous_sheep, first_sheep, last_sheep):
+    """Remove a live sheep from the sheeps of a cell."""
+    if previous_sheep[slot] == NO_SLOT:
+        first_sheep[cell] = next_sheep[slot]
+    else:
+        next_sheep[previous_sheep[slot]] = next_sheep[slot]
+    if next_sheep[slot] == NO_SLOT:
+        last_sheep[cell] = previous_sheep[slot]
+    else:
+        previous_sheep[next_sheep[slot]] = previous_sheep[slot]
+
+
+@jit
+def step_animals(
+    order,
+    draws,
+    species,
+    pos_x,
+    pos_y,
+    energy,
+    is_sick,
+    alive,
+    next_sheep,
+    previous_sheep,
+    first_sheep,
+    last_sheep,
+    nb_sick_sheeps,
+    grass,
+    rules,
+    add_sickness,
+    width,
+    height,
+    offsets,
+    deaths,
+    parents,
+):
+    """Run the step of each animal in the given order (see Sheep.step and
+    Wolf.step).
+
+    Args:
+        order (np.ndarray): the slots of the animals, in their activation order
+        draws (np.ndarray): NB_DRAWS random numbers for each animal of order
+        rules (np.ndarray): the move losses, the gains, the reproduction rates
+            of the sheeps and the wolves, then the cure, transmission and
+            sickness death probabilities
+        deaths (np.ndarray): receives the slots of the animals which died
+        parents (np.ndarray): receives the slots of the animals which reproduced
+
+    Returns:
+        counts (np.ndarray): the number of patches of grass eaten, infections,
+            cures, deaths and parents
+    """
+    nb_grass_eaten = 0
+    nb_infections = 0
+    nb_cures = 0
+    nb_deaths = 0
+    nb_parents = 0
+    for i in range(order.shape[0]):
+        slot = order[i]
+        if not alive[slot]:
+            continue
+        kind = species[slot]
+        # move
+        cell = pos_x[slot] * height + pos_y[slot]
+        new_x, new_y = random_neighbour(
+            pos_x[slot], pos_y[slot], draws[DRAW_MOVE, i], width, height, offsets
+        )
+        pos_x[slot] = new_x
+        pos_y[slot] = new_y
+        new_cell = new_x * height + new_y
+        energy[slot] -= rules[kind]
+        if kind == SHEEP:
+            unlink_sheep(
+                slot, cell, next_sheep, previous_sheep, first_sheep, last_sheep
+            )
+            link_sheep(
+                slot, new_cell, next_sheep, previous_sheep, first_sheep, last_sheep
+            )
+            if is_sick[slot]:
+                nb_sick_sheeps[cell] -= 1
+                nb_sick_sheeps[new_cell] += 1
+        cell = new_cell
+        # update sickness
+        if kind == SHEEP and add_sickness:
+            if is_sick[slot] and draws[DRAW_CURE, i] < rules[6]:
+                is_sick[slot] = False
+                nb_sick_sheeps[cell] -= 1
+                nb_cures += 1
+            if (
+                not is_sick[slot]
+                and nb_sick_sheeps[cell] > 0
+                and draws[DRAW_INFECTION, i] < rules[7]
+            ):
+                is_sick[slot] = True
+                nb_sick_sheeps[cell] += 1
+                nb_infections += 1
+        # die (the animal still eats and reproduces in this step)
+        dies = energy[slot] < 0
+        if (
+            not dies
+            and kind == SHEEP
+            and add_sickness
+            and is_sick[slot]
+            and draws[DRAW_SICKNESS_DEATH, i] < rules[8]
+        ):
+            dies = True
+        if dies:
+            alive[slot] = False
+            deaths[nb_deaths] = slot
+            nb_deaths += 1
+            if kind == SHEEP:
+                unlink_sheep(
+                    slot, cell, next_sheep, previous_sheep, first_sheep, last_sheep
+                )
+        # eat
+        if kind == SHEEP:
+            if grass[cell]:
+                grass[cell] = False
+                nb_grass_eaten += 1
+                energy[slot] += rules[2]
+        else:
+            prey = first_sheep[cell]
+            if prey != NO_SLOT:
+                energy[slot] += rules[3]
+                alive[prey] = False
+                deaths[nb_deaths] = prey
+                nb_deaths += 1
+                unlink_sheep(
+                    prey, cell, next_sheep, previous_sheep, first_sheep, last_sheep
+                )
+        # reproduce
+        if draws[DRAW_REPRODUCE, i] < rules[4 + kind]:
+            parents[nb_parents] = slot
+            nb_parents += 1
+    return np.array(
+        [nb_grass_eaten, nb_infections, nb_cures, nb_deaths, nb_parents],
+        dtype=np.int64,
+    )
+
+
+@jit
+def remove_animals(slots, species, pos_x, pos_y, is_sick, nb_sick_sheeps, height):
+    """Take dead animals off the sick counts of their cells."""
+    for slot in slots:
+        if species[slot] == SHEEP and is_sick[slot]:
+            nb_sick_sheeps[pos_x[slot] * height + pos_y[slot]] -= 1
+
+
+@jit
+def place_animals(
+    slots,
+    species,
+    pos_x,
+    pos_y,
+    is_sick,
+    alive,
+    next_sheep,
+    previous_sheep,
+    first_sheep,
+    last_sheep,
+    nb_sick_sheeps,
+    height,
+):
+    """Put new live animals on the cells given by their positions."""
+    for slot in slots:
+        alive[slot] = True
+        if species[slot] == SHEEP:
+            cell = pos_x[slot] * height + pos_y[slot]
+            link_sheep(slot, cell, next_sheep, previous_sheep, first_sheep, last_sheep)
+            if is_sick[slot]:
+                nb_sick_sheeps[cell] += 1
+
+
+class CompiledPreysPredatorsModel(mesa.Model):
+    """Preys-Predators model whose animal steps run in compiled loops.
+
+    It exposes the same interface as PreysPredatorsModel: step(),
+    step_phases(), config, grass_field, running, the population counters,
+    collect_population() and population_series.
+    """
+
+    # names of the columns of the animals, which grow() enlarges
+    COLUMNS = (
+        "unique_id",
+        "species",
+        "pos_x",
+        "pos_y",
+        "energy",
+        "is_sick",
+        "alive",
+        "next_sheep",
+        "previous_sheep",
+    )
+
+    def __init__(
+        self,
+        config,
+        seed: Optional[int] = None,
+        population_series: Optional[PopulationSeries] = None,
+    ):
+        super().__init__()
+        compile_kernels()
+        if seed is not None:
+            self.reset_randomizer(seed)
+        self.config = ModelConfig.coerce(config)
+        self.rng = np.random.default_rng(seed)
+        self.width = self.config.grid_width
+        self.height = self.config.grid_height
+        self.grass_field = GrassField(
+            self.width, self.height, self.config.grass_regrowth_time
+        )
+        nb_cells = self.width * self.height
+        # the live sheeps of each cell are a linked list, in their order of arrival
+        self.first_sheep = np.full(nb_cells, NO_SLOT, dtype=np.int64)
+        self.last_sheep = np.full(nb_cells, NO_SLOT, dtype=np.int64)
+        # sick sheeps of each cell, the dead ones included until the end of the step
+        self.nb_sick_sheeps = np.zeros(nb_cells, dtype=np.int64)
+        self.allocate(64)
+        # arguments of step_animals() which hold for the whole run
+        self.rules = np.array(
+            [
+                self.config.sheep_move_loss,
+                self.config.wolf_move_loss,
+                self.config.sheep_gain_from_grass,
+                self.config.wolf_gain_from_sheep,
+                self.config.sheep_reproduction_rate,
+                self.config.wolf_reproduction_rate,
+                self.config.sheep_cure_proba,
+                self.config.proba_sickness_transmission,
+                self.config.sickness_severity,
+            ],
+            dtype=np.float64,
+        )
+        # slots of the animals which died or reproduced during the step
+        self.deaths = np.empty(0, dtype=np.int64)
+        self.parents = np.empty(0, dtype=np.int64)
+        # population counters, updated at the end of each step
+        self.nb_sheeps = 0
+        self.nb_wolves = 0
+        self.nb_sheeps_sick = 0
+        # number of infections and cures since the last population collection
+        self.nb_infections = 0
+        self.nb_cures = 0
+        self.population_series = (
+            PopulationSeries() if population_series is None else population_series
+        )
+        self.running = False
+        self.init_all_agents()
+
+    def allocate(self, capacity: int):
+        """Create empty columns for capacity animals."""
+        self.unique_id = np.zeros(capacity, dtype=np.int64)
+        self.species = np.zeros(capacity, dtype=np.int8)
+        self.pos_x = np.zeros(capacity, dtype=np.int64)
+        self.pos_y = np.zeros(capacity, dtype=np.int64)
+        self.energy = np.zeros(capacity, dtype=np.float64)
+        self.is_sick = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.next_sheep = np.full(capacity, NO_SLOT, dtype=np.int64)
+        self.previous_sheep = np.full(capacity, NO_SLOT, dtype=np.int64)
+
+    def grow(self, min_capacity: int):
+        """Enlarge the columns so that they hold at least min_capacity animals."""
+        old_capacity = self.alive.shape[0]
+        new_capacity = max(2 * old_capacity, min_capacity)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            new_column = np.zeros(new_capacity, dtype=column.dtype)
+            new_column[:old_capacity] = column
+            setattr(self, name, new_column)
+
+    def add_animals(self, kind: int, pos_x: np.ndarray, pos_y: np.ndarray):
+        """Create animals of a species on the given cells, in free slots."""
+        nb_new = pos_x.shape[0]
+        free_slots = np.flatnonzero(~self.alive)
+        if free_slots.shape[0] < nb_new:
+            self.grow(self.alive.shape[0] + nb_new)
+            free_slots = np.flatnonzero(~self.alive)
+        slots = free_slots[:nb_new]
+        self.unique_id[slots] = np.arange(
+            self.current_id + 1, self.current_id + nb_new + 1
+        )
+        self.current_id += nb_new
+        self.species[slots] = kind
+        self.pos_x[slots] = pos_x
+        self.pos_y[slots] = pos_y
+        if kind == SHEEP:
+            self.energy[slots] = self.config.sheep_init_energy
+            self.is_sick[slots] = (
+                self.rng.random(nb_new) > self.config.sheep_sanity_proba
+            )
+        else:
+            self.energy[slots] = self.config.wolf_init_energy
+            self.is_sick[slots] = False
+        place_animals(
+            slots,
+            self.species,
+            self.pos_x,
+            self.pos_y,
+            self.is_sick,
+            self.alive,
+            self.next_sheep,
+            self.previous_sheep,
+            self.first_sheep,
+            self.last_sheep,
+            self.nb_sick_sheeps,
+            self.height,
+        )
+
+    def init_all_agents(self):
+        """Create the initial population."""
+        for kind, nb_animals in (
+            (SHEEP, self.config.init_nb_sheeps),
+            (WOLF, self.config.init_nb_wolves),
+        ):
+            self.add_animals(
+                kind,
+                self.rng.integers(self.width, size=nb_animals),
+                self.rng.integers(self.height, size=nb_animals),
+            )
+        self.update_counters()
+
+    def update_counters(self):
+        """Count the animals of each species and the sick sheeps."""
+        sheeps = self.alive & (self.species == SHEEP)
+        self.nb_sheeps = int(np.count_nonzero(sheeps))
+        self.nb_wolves = int(np.count_nonzero(self.alive)) - self.nb_sheeps
+        self.nb_sheeps_sick = int(np.count_nonzero(sheeps & self.is_sick))
+
+    def step_agents(self):
+        """Run the steps of the animals, in a random order."""
+        order = self.rng.permutation(np.flatnonzero(self.alive))
+        draws = self.rng.random((NB_DRAWS, order.shape[0]))
+        # an animal dies at most once, and its prey at most once more
+        deaths = np.empty(2 * order.shape[0], dtype=np.int64)
+        parents = np.empty(order.shape[0], dtype=np.int64)
+        nb_grass_eaten, nb_infections, nb_cures, nb_deaths, nb_parents = step_animals(
+            order,
+            draws,
+            self.species,
+            self.pos_x,
+            self.pos_y,
+            self.energy,
+            self.is_sick,
+            self.alive,
+            self.next_sheep,
+            self.previous_sheep,
+            self.first_sheep,
+            self.last_sheep,
+            self.nb_sick_sheeps,
+            self.grass_field.grass.reshape(-1),
+            self.rules,
+            self.config.add_sickness,
+            self.width,
+            self.height,
+            MOORE_OFFSETS_ARRAY,
+            deaths,
+            parents,
+        ).tolist()
+        self.grass_field.nb_grass -= nb_grass_eaten
+        self.nb_infections += nb_infections
+        self.nb_cures += nb_cures
+        self.deaths = deaths[:nb_deaths]
+        self.parents = parents[:nb_parents]
+
+    def give_birth_to_agents(self):
+        """Remove the dead animals, then create the animals born during the step.
+
+        As with the agents, the newborns enter the cells of their parents in
+        the reverse order of their births.
+        """
+        parents = self.parents[::-1]
+        species = self.species[parents]
+        pos_x = self.pos_x[parents]
+        pos_y = self.pos_y[parents]
+        remove_animals(
+            self.deaths,
+            self.species,
+            self.pos_x,
+            self.pos_y,
+            self.is_sick,
+            self.nb_sick_sheeps,
+            self.height,
+        )
+        for kind in (SHEEP, WOLF):
+            newborns = species == kind
+            self.add_animals(kind, pos_x[newborns], pos_y[newborns])
+        self.update_counters()
+
+    def animal_cells(self) -> tuple:
+        """Locate the animals on the grid (see PreysPredatorsModel.animal_cells)."""
+        sheeps = self.alive & (self.species == SHEEP)
+        wolves = self.alive & (self.species == WOLF)
+        return (
+            self.pos_x[sheeps] * self.height + self.pos_y[sheeps],
+            self.is_sick[sheeps],
+            self.pos_x[wolves] * self.height + self.pos_y[wolves],
+        )
+
+    def population_row(self) -> tuple:
+        """Return the current populations and the sickness changes since the
+        previous row, then reset the latter."""
+        row = (
+            self.nb_sheeps,
+            self.nb_wolves,
+            self.grass_field.count_grass(),
+            self.nb_sheeps_sick,
+            self.nb_infections,
+            self.nb_cures,
+        )
+        self.nb_infections = 0
+        self.nb_cures = 0
+        return row
+
+    def collect_population(self):
+        """Append the row of the current populations to the population series."""
+        self.population_series.append(self.population_row())
+
+    def step_phases(self) -> list:
+        """List the methods run by step(), in their order."""
+        return [
+            self.collect_population,
+            self.step_agents,
+            self.grass_field.step,
+            self.give_birth_to_agents,
+        ]
+
+    def step(self):
+        """Handle a generic step for the whole model."""
+        for phase in self.step_phases():
+            phase()
@@ -6,3 +6,22 @@ class UnsupportedMovingMethodError(Exception):
 
     def __init__(self):
         pass
+
+
+class PopulationCountersError(Exception):
+    """Error raised when the population counters of the model are inconsistent."""
+
+    def __init__(self, counted: tuple, scanned: tuple):
+        super().__init__(
+            f"Population counters {counted} differ from a full scan {scanned}"
+        )
+
+
+class ModelConfigError(ValueError):
+    """Error raised when a model parameter is unknown or has an invalid value."""
+
+    def __init__(self, name, value=None, kind: str = ""):
+        if kind:
+            super().__init__(f"Invalid {kind} {value!r} for the parameter {name}")
+        else:
+            super().__init__(f"Unknown model parameters: {name}")
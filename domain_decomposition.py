@@ -0,0 +1,333 @@
+"""Split one large run of the model over several worker processes.
+
+The toroidal grid is cut into vertical strips of columns, the tiles, and each
+tile is stepped by its own process: a TileModel holds the animals standing on
+the tile and the grass of its cells. Since an animal moves to one of its
+Moore neighbours, the rest of its step (sickness, deaths, meals and births)
+only involves its own cell. A tiled run follows the staged activation (see
+staged_activation.py), whatever the "activation" parameter: the main process
+draws the order of the species at each step, and for each species in turn
+
+1. every tile moves the animals of the species, and sends the ones which left
+   the tile (the halo of the tile, one column on each side) to the main
+   process, which routes them to the tiles owning their new cells;
+2. every tile adds the animals it received, with their whole state, then runs
+   the other stages of the species.
+
+The tiles then run the grass regrowth, the deaths and the births, and the
+main process sums their populations. The only difference with a single model
+is at the boundaries of the tiles: a sheep which left a tile is no longer
+counted as a sick cellmate on its start cell (see
+sheep_wolves_grass.count_sick_cellmates()).
+The tiles use the sparse grid storage, so each one only stores the animals
+standing on it and the grass of its own cells.
+
+Usage example:
+    python -m batch_runner --backend tiles --tiles 4 --steps 100 --grid-width 2000
+"""
+import contextlib
+import io
+import multiprocessing
+from typing import Optional
+import numpy as np
+
+from population_series import PopulationSeries
+from simulation_config import ModelConfig
+from sheep_wolves_grass import GrassField, PreysPredatorsModel, Sheep, Wolf
+from sparse_grid import SPARSE_GRID
+from staged_activation import STAGED_ACTIVATION, run_stage
+
+# codes of the species of the migrating animals
+SPECIES_CLASSES = (Sheep, Wolf)
+
+
+def tile_bounds(width: int, nb_tiles: int, tile_index: int) -> tuple:
+    """Return the first column of a tile and the one following its last column."""
+    return tile_index * width // nb_tiles, (tile_index + 1) * width // nb_tiles
+
+
+def tile_share(total: int, width: int, nb_tiles: int, tile_index: int) -> int:
+    """Split a number of animals between the tiles in proportion to their width."""
+    x_start, x_end = tile_bounds(width, nb_tiles, tile_index)
+    return total * x_end // width - total * x_start // width
+
+
+class TileGrassField(GrassField):
+    """Grass of the cells of a tile, indexed by the positions on the whole grid."""
+
+    def __init__(self, x_start: int, width: int, height: int, regrowth_time: int):
+        super().__init__(width, height, regrowth_time)
+        self.x_start = x_start
+
+    def eat(self, pos: tuple) -> bool:
+        return super().eat((pos[0] - self.x_start, pos[1]))
+
+
+class TileModel(PreysPredatorsModel):
+    """Part of a model made of the animals and the grass of one tile.
+
+    The positions are the ones of the whole grid, so that the moves wrap
+    around the torus as in a single model. The IDs of the new animals are
+    interleaved between the tiles, so that they stay unique.
+    """
+
+    def __init__(self, config, nb_tiles: int, tile_index: int, seed: int):
+        config = ModelConfig.coerce(config)
+        self.nb_tiles = nb_tiles
+        self.tile_index = tile_index
+        self.x_start, self.x_end = tile_bounds(config.grid_width, nb_tiles, tile_index)
+        super().__init__(
+            config.replace(
+                init_nb_sheeps=tile_share(
+                    config.init_nb_sheeps, config.grid_width, nb_tiles, tile_index
+                ),
+                init_nb_wolves=tile_share(
+                    config.init_nb_wolves, config.grid_width, nb_tiles, tile_index
+                ),
+                activation=STAGED_ACTIVATION,
+                grid_storage=SPARSE_GRID,
+            ),
+            seed=seed,
+        )
+        # the stages after the move, which only involve the cell of each animal
+        self.scheduler.stages.remove("move")
+        # agents of each species, in their activation order (set at each step)
+        self.agents_by_species = {}
+
+    def create_grass_field(self) -> GrassField:
+        return TileGrassField(
+            self.x_start,
+            self.x_end - self.x_start,
+            self.config.grid_height,
+            self.config.grass_regrowth_time,
+        )
+
+    def random_position(self) -> tuple:
+        pos_x = self.x_start + self.random.randrange(self.x_end - self.x_start)
+        pos_y = self.random.randrange(self.grid.height)
+        return pos_x, pos_y
+
+    def next_id(self) -> int:
+        self.current_id += 1
+        return self.current_id * self.nb_tiles + self.tile_index
+
+    def start_step(self):
+        """Draw the random numbers of the step and shuffle the agents."""
+        self.draw_random_numbers()
+        self.agents_by_species = {species: [] for species in SPECIES_CLASSES}
+        for agent in self.scheduler.agent_buffer(shuffled=True):
+            self.agents_by_species[type(agent)].append(agent)
+
+    def move_species(self, species_code: int) -> list:
+        """Move the animals of a species and remove the ones which left the tile.
+
+        Returns:
+            emigrants (list): (species code, state) of each animal which left,
+                where state holds all its attributes but the model
+        """
+        species = SPECIES_CLASSES[species_code]
+        agents = self.agents_by_species[species]
+        run_stage(species.move, agents)
+        staying = []
+        emigrants = []
+        for agent in agents:
+            if self.x_start <= agent.pos[0] < self.x_end:
+                staying.append(agent)
+            else:
+                state = dict(vars(agent))
+                del state["model"]
+                emigrants.append((species_code, state))
+                self.remove_agent(agent)
+        self.agents_by_species[species] = staying
+        return emigrants
+
+    def add_immigrants(self, immigrants: list):
+        """Add the animals which moved into the tile (see move_species()).
+
+        The animals are restored from their state, without calling __init__(),
+        which would draw a random number and reset their state.
+        """
+        for species_code, state in immigrants:
+            species = SPECIES_CLASSES[species_code]
+            agent = species.__new__(species)
+            agent.__dict__.update(state)
+            agent.model = self
+            self.add_agent(agent, state["pos"])
+            self.agents_by_species[species].append(agent)
+
+    def step_species(self, species_code: int, immigrants: list):
+        """Add the immigrants of a species, then run its stages after the move.
+
+        The random numbers are drawn again, so that the immigrants get theirs.
+        """
+        self.add_immigrants(immigrants)
+        species = SPECIES_CLASSES[species_code]
+        agents = self.agents_by_species[species]
+        self.random.shuffle(agents)
+        self.draw_random_numbers()
+        self.scheduler.run_stages(species, agents, self.scheduler.stages)
+
+    def step_phases(self) -> list:
+        """List the methods run by step(), after the stages of the species."""
+        return [
+            self.grass_field.step,
+            self.kill_agents,
+            self.give_birth_to_agents,
+        ]
+
+    def step(self):
+        """End a step, once all the species ran their stages."""
+        for phase in self.step_phases():
+            phase()
+        self.scheduler.steps += 1
+        self.scheduler.time += 1
+
+
+def run_tile(connection, config: dict, nb_tiles: int, tile_index: int, seed: int):
+    """Step a tile on the requests of the main process (run in a worker process).
+
+    The worker sends the population row of its tile once created. Then, for
+    each step, it receives the order of the species, and for each species it
+    sends its emigrants and receives its immigrants. It ends the step by
+    sending its new population row. It stops when it receives None or the
+    pipe is closed.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = TileModel(config, nb_tiles, tile_index, seed)
+    connection.send(model.population_row())
+    while True:
+        try:
+            species_order = connection.recv()
+        except EOFError:
+            break
+        if species_order is None:
+            break
+        model.start_step()
+        for species_code in species_order:
+            connection.send(model.move_species(species_code))
+            model.step_species(species_code, connection.recv())
+        model.step()
+        connection.send(model.population_row())
+    connection.close()
+
+
+class TiledPreysPredatorsModel:
+    """Preys-Predators model stepped by one worker process per tile.
+
+    It runs like a PreysPredatorsModel (step(), collect_population(), running
+    and population_series), and close() stops the workers.
+    """
+
+    def __init__(
+        self,
+        config,
+        seed: Optional[int] = None,
+        population_series: Optional[PopulationSeries] = None,
+        nb_tiles: Optional[int] = None,
+    ):
+        """Create the tiles, each in its own worker process.
+
+        Args:
+            config (ModelConfig): the parameters of the model (or a dictionary)
+            seed (int): seed from which the seeds of the tiles are derived
+            population_series (PopulationSeries): see PreysPredatorsModel
+            nb_tiles (int): number of tiles (one per CPU by default), at most
+                the width of the grid
+        """
+        self.config = ModelConfig.coerce(config)
+        nb_tiles = nb_tiles or multiprocessing.cpu_count()
+        if not 1 <= nb_tiles <= self.config.grid_width:
+            raise ValueError(
+                f"Expected between 1 and {self.config.grid_width} tiles, "
+                f"got {nb_tiles}"
+            )
+        self.nb_tiles = nb_tiles
+        # column_tiles[x] is the index of the tile owning the column x
+        tile_starts = [
+            tile_bounds(self.config.grid_width, nb_tiles, i)[0]
+            for i in range(nb_tiles + 1)
+        ]
+        self.column_tiles = np.repeat(np.arange(nb_tiles), np.diff(tile_starts))
+        self.population_series = (
+            PopulationSeries() if population_series is None else population_series
+        )
+        self.running = False
+        self.steps = 0
+        # number of animals of each species which changed tile since the creation
+        self.nb_migrants = [0] * len(SPECIES_CLASSES)
+        seed_sequence = np.random.SeedSequence(seed)
+        tile_seeds = seed_sequence.generate_state(nb_tiles).tolist()
+        # generator of the order of the species at each step
+        self.rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+        self.connections = []
+        self.workers = []
+        for tile_index, tile_seed in enumerate(tile_seeds):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=run_tile,
+                args=(
+                    worker_connection,
+                    self.config.as_dict(),
+                    nb_tiles,
+                    tile_index,
+                    tile_seed,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+        # population rows of the tiles, summed by collect_population()
+        self.tile_rows = [connection.recv() for connection in self.connections]
+        print(f"[Model] Created a Preys-Predators model of {nb_tiles} tiles.")
+        print("[Model] The tiles run the staged activation.")
+
+    def collect_population(self):
+        """Append the sum of the population rows of the tiles to the series."""
+        self.population_series.append(tuple(np.sum(self.tile_rows, axis=0).tolist()))
+
+    def step(self):
+        """Step all the tiles and route the animals which changed tile."""
+        self.collect_population()
+        # as with the staged activation, the species are stepped in a random order
+        species_order = list(range(len(SPECIES_CLASSES)))
+        if self.rng.random() < 0.5:
+            species_order.reverse()
+        for connection in self.connections:
+            connection.send(species_order)
+        for species_code in species_order:
+            immigrants = [[] for _ in range(self.nb_tiles)]
+            for connection in self.connections:
+                for emigrant in connection.recv():
+                    pos_x = emigrant[1]["pos"][0]
+                    immigrants[self.column_tiles[pos_x]].append(emigrant)
+                    self.nb_migrants[species_code] += 1
+            for connection, tile_immigrants in zip(self.connections, immigrants):
+                connection.send(tile_immigrants)
+        self.tile_rows = [connection.recv() for connection in self.connections]
+        self.steps += 1
+
+    def close(self, terminate: bool = False):
+        """Stop the worker processes.
+
+        Args:
+            terminate (bool): kill the workers instead of asking them to stop,
+                e.g. after a failed step which left them waiting on their pipe
+        """
+        for connection in self.connections:
+            if not terminate:
+                connection.send(None)
+            connection.close()
+        for worker in self.workers:
+            if terminate:
+                worker.terminate()
+            worker.join()
+        self.connections = []
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(terminate=exc_type is not None)
@@ -0,0 +1,269 @@
+"""Step many replicas of the model at once, as one batch of arrays.
+
+An EnsembleModel holds R replicas of the same configuration. They differ only
+by their random numbers. The animals of all the replicas share the columns of
+the array backend (see array_population.py), with one more column holding the
+replica of each animal. The grass of the replicas is stacked into a single
+grid, so a flat cell index (replica * width * height + x * height + y) tells
+apart the cells of the replicas. The moves, meals, infections, deaths and
+births of all the replicas are then computed with the same few array
+operations per step as a single model of the array backend. This removes the
+Python overhead that R separate models pay at each step.
+
+The result is a tensor of populations of shape (R, T, C): one row per replica
+and per collected step, with the C columns of POPULATION_COLUMNS.
+
+Usage example:
+    python -m ensemble --replicas 200 --steps 500 --output ensemble.npz
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import batch_runner
+from array_population import ArrayPreysPredatorsModel, SpeciesArrays
+from population_series import POPULATION_COLUMNS
+from sheep_wolves_grass import GrassField
+
+# pylint: disable=consider-using-f-string
+
+
+class EnsembleSpeciesArrays(SpeciesArrays):
+    """Columns of the animals of one species, for all the replicas."""
+
+    COLUMNS = (*SpeciesArrays.COLUMNS, "replica")
+
+    def __init__(self, capacity: int = 64):
+        super().__init__(capacity)
+        self.replica = np.zeros(capacity, dtype=np.int64)
+
+    def add(
+        self,
+        unique_id: np.ndarray,
+        pos_x: np.ndarray,
+        pos_y: np.ndarray,
+        energy,
+        is_sick: np.ndarray,
+        replica: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Add animals in free slots, in the given replicas.
+
+        Returns:
+            slots (np.ndarray): the slots of the new animals
+        """
+        slots = super().add(unique_id, pos_x, pos_y, energy, is_sick)
+        self.replica[slots] = 0 if replica is None else replica
+        return slots
+
+    def count_by_replica(self, nb_replicas: int, mask: np.ndarray) -> np.ndarray:
+        """Count the animals of each replica which are selected by a mask."""
+        return np.bincount(self.replica[mask], minlength=nb_replicas)
+
+
+class EnsembleModel(ArrayPreysPredatorsModel):
+    """Replicas of the array backend model, stepped together.
+
+    Each replica follows the rules of ArrayPreysPredatorsModel, including the
+    random order of the two species at each step, which is drawn per replica.
+    """
+
+    def __init__(self, config, nb_replicas: int, seed: Optional[int] = None):
+        """Create the replicas with their initial population.
+
+        Args:
+            config (ModelConfig): the parameters shared by all the replicas
+            nb_replicas (int): the number of replicas
+            seed (int): seed of the random generator shared by the replicas
+        """
+        if nb_replicas < 1:
+            raise ValueError(f"Expected at least one replica, got {nb_replicas}")
+        self.nb_replicas = nb_replicas
+        super().__init__(config, seed)
+        # numbers of infections and cures of each replica since the last collection
+        self.nb_infections = np.zeros(nb_replicas, dtype=np.int64)
+        self.nb_cures = np.zeros(nb_replicas, dtype=np.int64)
+        # population rows of the replicas, one (R, C) array per collection
+        self.population_rows = []
+
+    def create_grass_field(self) -> GrassField:
+        """Stack the grids of the replicas along the x axis."""
+        return GrassField(
+            self.nb_replicas * self.width,
+            self.height,
+            self.config.grass_regrowth_time,
+        )
+
+    def create_species_arrays(self) -> SpeciesArrays:
+        return EnsembleSpeciesArrays()
+
+    def add_sheeps(self, pos_x: np.ndarray, pos_y: np.ndarray, replica: np.ndarray):
+        """Create sheeps on the given cells of the given replicas."""
+        nb_sheeps = pos_x.shape[0]
+        is_sick = self.rng.random(nb_sheeps) > self.config.sheep_sanity_proba
+        self.sheeps.add(
+            self.next_ids(nb_sheeps),
+            pos_x,
+            pos_y,
+            self.config.sheep_init_energy,
+            is_sick,
+            replica,
+        )
+
+    def add_wolves(self, pos_x: np.ndarray, pos_y: np.ndarray, replica: np.ndarray):
+        """Create wolves on the given cells of the given replicas."""
+        nb_wolves = pos_x.shape[0]
+        self.wolves.add(
+            self.next_ids(nb_wolves),
+            pos_x,
+            pos_y,
+            self.config.wolf_init_energy,
+            np.zeros(nb_wolves, dtype=bool),
+            replica,
+        )
+
+    def init_all_agents(self):
+        """Create the initial population of every replica."""
+        for nb_animals, add_species in (
+            (self.config.init_nb_sheeps, self.add_sheeps),
+            (self.config.init_nb_wolves, self.add_wolves),
+        ):
+            nb_total = nb_animals * self.nb_replicas
+            add_species(
+                self.rng.integers(self.width, size=nb_total),
+                self.rng.integers(self.height, size=nb_total),
+                np.repeat(np.arange(self.nb_replicas), nb_animals),
+            )
+
+    def cells(self, species: SpeciesArrays, slots: np.ndarray) -> np.ndarray:
+        """Flat index of the cells of some animals in the stacked grids."""
+        return (
+            species.replica[slots] * self.width + species.pos_x[slots]
+        ) * self.height + species.pos_y[slots]
+
+    def birth_places(self, species: SpeciesArrays, parents: np.ndarray) -> tuple:
+        return (
+            species.pos_x[parents],
+            species.pos_y[parents],
+            species.replica[parents],
+        )
+
+    def record_sickness_changes(self, cured: np.ndarray, infected: np.ndarray):
+        self.nb_cures += np.bincount(
+            self.sheeps.replica[cured], minlength=self.nb_replicas
+        )
+        self.nb_infections += np.bincount(
+            self.sheeps.replica[infected], minlength=self.nb_replicas
+        )
+
+    def replica_populations(self) -> np.ndarray:
+        """Return the populations of each replica, as rows of POPULATION_COLUMNS."""
+        sheeps = self.sheeps
+        return np.column_stack(
+            [
+                sheeps.count_by_replica(self.nb_replicas, sheeps.alive),
+                self.wolves.count_by_replica(self.nb_replicas, self.wolves.alive),
+                np.count_nonzero(
+                    self.grass_field.grass.reshape(self.nb_replicas, -1), axis=1
+                ),
+                sheeps.count_by_replica(
+                    self.nb_replicas, sheeps.alive & sheeps.is_sick
+                ),
+                self.nb_infections,
+                self.nb_cures,
+            ]
+        )
+
+    def collect_population(self):
+        """Record the populations of the replicas and the sickness changes since
+        the previous collection."""
+        self.population_rows.append(self.replica_populations())
+        self.nb_infections = np.zeros(self.nb_replicas, dtype=np.int64)
+        self.nb_cures = np.zeros(self.nb_replicas, dtype=np.int64)
+
+    def populations(self) -> np.ndarray:
+        """Return the collected populations.
+
+        Returns:
+            populations (np.ndarray): tensor of shape (R, T, C), with the C
+                POPULATION_COLUMNS of each replica at each collection
+        """
+        if not self.population_rows:
+            return np.zeros((self.nb_replicas, 0, len(POPULATION_COLUMNS)), np.int64)
+        return np.stack(self.population_rows, axis=1)
+
+    def step(self):
+        """Step all the replicas.
+
+        The sheeps of the replicas where they come first are stepped, then the
+        wolves of all the replicas, then the other sheeps.
+        """
+        self.collect_population()
+        sheeps_first = self.rng.random(self.nb_replicas) < 0.5
+        sheeps = self.sheeps
+        self.step_sheeps(np.flatnonzero(sheeps.alive & sheeps_first[sheeps.replica]))
+        self.step_wolves()
+        self.step_sheeps(np.flatnonzero(sheeps.alive & ~sheeps_first[sheeps.replica]))
+        self.grass_field.step()
+        self.give_birth_to_agents()
+
+
+def run_ensemble(
+    model_config: dict, nb_replicas: int, nb_steps: int, seed: Optional[int] = None
+) -> np.ndarray:
+    """Run an ensemble for a given number of steps.
+
+    Returns:
+        populations (np.ndarray): tensor of shape (R, nb_steps + 1, C), from
+            the initial step to the last one
+    """
+    model = EnsembleModel(model_config, nb_replicas, seed)
+    model.running = True
+    for _ in range(nb_steps):
+        model.step()
+    # collect the state reached after the last step
+    model.collect_population()
+    return model.populations()
+
+
+def main(argv: Optional[list] = None):
+    """Entry point of the ensemble runner."""
+    parser = argparse.ArgumentParser(
+        description="Run many replicas of the model as one batch of arrays."
+    )
+    parser.add_argument("--replicas", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--config", type=Path, default=None, help="JSON or TOML file of model parameters"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("ensemble.npz"),
+        help="NPZ file with one (replicas, steps) array per population",
+    )
+    args = parser.parse_args(argv)
+    model_config = batch_runner.load_model_config(args.config)
+    start = time.perf_counter()
+    populations = run_ensemble(model_config, args.replicas, args.steps, args.seed)
+    duration = time.perf_counter() - start
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        args.output,
+        **{name: populations[:, :, i] for i, name in enumerate(POPULATION_COLUMNS)},
+    )
+    print(
+        "[Ensemble] {} replicas x {} steps in {:.1f} s "
+        "({:.0f} replica steps/s)".format(
+            args.replicas,
+            args.steps,
+            duration,
+            args.replicas * args.steps / duration if duration else float("inf"),
+        )
+    )
+    print("[Ensemble] Populations written to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
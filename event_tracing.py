@@ -0,0 +1,56 @@
+"""Record the events of a simulation as JSON lines.
+
+The agents only build an event when the model has a tracer, so tracing costs
+a single attribute check per event when it is disabled.
+
+Each line of the trace is a compact JSON object such as:
+    {"step":12,"event":"meal","species":"Wolf","id":57,"prey":31}
+"""
+import json
+from pathlib import Path
+
+# Kinds of events written in the trace
+BIRTH = "birth"
+DEATH = "death"
+MEAL = "meal"
+INFECTION = "infection"
+CURE = "cure"
+
+
+class EventTracer:
+    """Write the births, deaths, meals and infections of a model to a file."""
+
+    def __init__(self, model, trace_path: Path):
+        self.model = model
+        self.trace_path = Path(trace_path)
+        self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+        self.trace_file = open(self.trace_path, "w", encoding="utf-8")
+        self.encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def record(self, event: str, agent, **fields):
+        """Write an event about an agent.
+
+        Args:
+            event (str): the kind of event (BIRTH, DEATH, MEAL, ...)
+            agent (mesa.Agent): the agent concerned by the event
+            fields: additional values to record with the event
+        """
+        record = {
+            "step": self.model.scheduler.steps,
+            "event": event,
+            "species": type(agent).__name__,
+            "id": agent.unique_id,
+        }
+        record.update(fields)
+        self.trace_file.write(self.encoder.encode(record))
+        self.trace_file.write("\n")
+
+    def close(self):
+        """Flush the events and close the trace file."""
+        self.trace_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,38 @@
+"""Build the matrix of colour codes displayed on the grid plot."""
+import numpy as np
+import simulation_constants as cons
+
+
+class GridRasterizer:
+    """Compute the colour code of every cell of the grid with array operations.
+
+    The matrix is preallocated once and filled again at each frame. A cell
+    takes the colour of its occupant with the highest priority:
+    wolf > sick sheep > healthy sheep > grass > dirt.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.population_matrix = np.empty((width, height), dtype=np.int64)
+        self.flat_matrix = self.population_matrix.reshape(-1)
+
+    def rasterize(self, model, show_sickness: bool) -> np.ndarray:
+        """Compute the population matrix of a model.
+
+        Args:
+            model: a PreysPredatorsModel or an ArrayPreysPredatorsModel
+            show_sickness (bool): display the sick sheeps with their own colour
+
+        Returns:
+            population_matrix (np.ndarray): the colour code of each cell (this
+                buffer is reused by the next call)
+        """
+        sheep_cells, sheep_sick, wolf_cells = model.animal_cells()
+        if not show_sickness:
+            sheep_sick = np.zeros_like(sheep_sick)
+        # fill by increasing priority, the last write wins
+        self.flat_matrix.fill(cons.BROWN_PATCH)
+        self.flat_matrix[model.grass_field.grass.reshape(-1)] = cons.GREEN_PATCH
+        self.flat_matrix[sheep_cells[~sheep_sick]] = cons.HEALTHY_SHEEP
+        self.flat_matrix[sheep_cells[sheep_sick]] = cons.SICK_SHEEP
+        self.flat_matrix[wolf_cells] = cons.WOLF
+        return self.population_matrix
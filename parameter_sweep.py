@@ -0,0 +1,273 @@
+"""Sweep the model parameters over a pool of worker processes.
+
+Every combination of the parameter values is run several times (replicates)
+with its own seed. The populations of all the runs are streamed into a single
+CSV table with one row per run and per step. A sweep which has been
+interrupted resumes where it stopped when it is launched again with the same
+arguments. The sweep (values, seeds, steps...) is stored next to the output
+file, and a sweep with other arguments refuses to resume it.
+
+Usage example:
+    python -m parameter_sweep sweep.json --replicates 10 --steps 500 --output sweep.csv
+
+where sweep.json maps model parameters to lists of values, for instance
+{"sheep_reproduction_rate": [0.02, 0.04], "grass_regrowth_time": [20, 30, 40]}.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+import batch_runner
+import simulation_config as config
+from custom_errors import ModelConfigError
+
+# pylint: disable=consider-using-f-string
+
+RUN_COLUMNS = ["run_id", "replicate", "seed"]
+
+
+def build_runs(parameter_ranges: dict, nb_replicates: int, base_seed: int = 0) -> list:
+    """List the runs of a sweep.
+
+    Args:
+        parameter_ranges (dict): the values taken by each swept parameter
+        nb_replicates (int): the number of runs for each combination of values
+        base_seed (int): the seed of the run i is base_seed + i
+
+    Returns:
+        runs (list): one dictionary per run with its ID, replicate, seed
+            and the values of the swept parameters
+
+    Raises:
+        ModelConfigError: if a swept parameter is unknown
+    """
+    unknown_keys = set(parameter_ranges) - set(config.MODEL_CONFIG_FIELDS)
+    if unknown_keys:
+        raise ModelConfigError(sorted(unknown_keys))
+    names = list(parameter_ranges)
+    runs = []
+    for values in itertools.product(*(parameter_ranges[name] for name in names)):
+        for replicate in range(nb_replicates):
+            run_id = len(runs)
+            run = {"run_id": run_id, "replicate": replicate, "seed": base_seed + run_id}
+            run.update(zip(names, values))
+            runs.append(run)
+    return runs
+
+
+def run_config(run: dict, base_config: dict) -> dict:
+    """Return the model configuration of a run of the sweep."""
+    model_config = dict(base_config)
+    model_config.update(
+        {key: value for key, value in run.items() if key not in RUN_COLUMNS}
+    )
+    return model_config
+
+
+def execute_run(run: dict, base_config: dict, nb_steps: int, backend: str) -> tuple:
+    """Run the model for one point of the sweep (executed in a worker process).
+
+    Returns:
+        run, populations (tuple): the run description and its population series
+    """
+    model_config = run_config(run, base_config)
+    # the model reports its configuration on stdout, which is noise here
+    with contextlib.redirect_stdout(io.StringIO()):
+        population_series = batch_runner.run_simulation(
+            model_config, nb_steps, run["seed"], backend=backend
+        )
+    return run, population_series.view()
+
+
+def describe_sweep(
+    parameter_ranges: dict, runs: list, nb_steps: int, base_config, backend: str
+) -> dict:
+    """Describe a sweep (as it is stored in JSON), to recognize it when resumed."""
+    definition = {
+        "parameter_ranges": parameter_ranges,
+        "seeds": [run["seed"] for run in runs],
+        "nb_steps": nb_steps,
+        "base_config": dict(base_config),
+        "backend": backend,
+    }
+    return json.loads(json.dumps(definition))
+
+
+def read_completed_runs(
+    output_path: Path,
+    done_path: Path,
+    header: list,
+    definition_path: Path,
+    definition: dict,
+) -> set:
+    """Find the runs already written by a previous (interrupted) sweep.
+
+    Rows which belong to runs not recorded as complete are dropped from the
+    output file, so that those runs can be written again from scratch.
+
+    Args:
+        output_path (Path): the CSV file of the populations
+        done_path (Path): the file listing the IDs of the complete runs
+        header (list): the columns of the output file
+        definition_path (Path): the JSON file describing the previous sweep
+        definition (dict): the description of the sweep (see describe_sweep())
+
+    Returns:
+        completed_runs (set): the IDs of the complete runs
+
+    Raises:
+        ValueError: if the output file was written by a different sweep
+    """
+    if not output_path.exists() or not done_path.exists():
+        return set()
+    different_sweep = ValueError(
+        "{} was written by a different sweep; remove it or change the output.".format(
+            output_path
+        )
+    )
+    if not definition_path.exists():
+        raise different_sweep
+    with open(definition_path, "r", encoding="utf-8") as definition_file:
+        if json.load(definition_file) != definition:
+            raise different_sweep
+    with open(done_path, "r", encoding="utf-8") as done_file:
+        completed_runs = {int(line) for line in done_file if line.strip().isdigit()}
+    kept_rows = []
+    with open(output_path, "r", encoding="utf-8", newline="") as output_file:
+        reader = csv.reader(output_file)
+        if next(reader, None) != header:
+            raise different_sweep
+        for row in reader:
+            if len(row) == len(header) and int(row[0]) in completed_runs:
+                kept_rows.append(row)
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8", newline="") as tmp_file:
+        writer = csv.writer(tmp_file)
+        writer.writerow(header)
+        writer.writerows(kept_rows)
+    os.replace(tmp_path, output_path)
+    return completed_runs
+
+
+def run_sweep(
+    parameter_ranges: dict,
+    nb_replicates: int,
+    nb_steps: int,
+    output_path: Path,
+    base_config: Optional[dict] = None,
+    max_workers: Optional[int] = None,
+    base_seed: int = 0,
+    backend: str = "agents",
+) -> Path:
+    """Run a parameter sweep and write the populations to a CSV table.
+
+    Args:
+        parameter_ranges (dict): the values taken by each swept parameter
+        nb_replicates (int): the number of runs for each combination of values
+        nb_steps (int): the number of steps of each run
+        output_path (Path): CSV file where to write the populations
+        base_config (dict): configuration of the parameters which are not swept
+            (the default configuration if not given)
+        max_workers (int): the number of worker processes (one per CPU by default)
+        base_seed (int): the seed of the run i is base_seed + i
+        backend (str): the population backend (see batch_runner.MODEL_BACKENDS)
+
+    Returns:
+        output_path (Path): the CSV file with the populations
+
+    Raises:
+        ModelConfigError: if a parameter is unknown or a point has an invalid value
+    """
+    output_path = Path(output_path)
+    done_path = output_path.with_suffix(output_path.suffix + ".done")
+    # the grid of values, the seeds, ... of the sweep, checked when it resumes
+    definition_path = output_path.with_suffix(output_path.suffix + ".sweep.json")
+    if base_config is None:
+        base_config = config.create_model_default_config()
+    runs = build_runs(parameter_ranges, nb_replicates, base_seed)
+    # the invalid values are reported before any file is written or run started
+    for run in runs:
+        config.ModelConfig(**run_config(run, base_config))
+    definition = describe_sweep(parameter_ranges, runs, nb_steps, base_config, backend)
+    run_columns = RUN_COLUMNS + list(parameter_ranges)
+    header = run_columns + batch_runner.POPULATION_COLUMNS
+    completed_runs = read_completed_runs(
+        output_path, done_path, header, definition_path, definition
+    )
+    pending_runs = [run for run in runs if run["run_id"] not in completed_runs]
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if not completed_runs:
+        with open(output_path, "w", encoding="utf-8", newline="") as output_file:
+            csv.writer(output_file).writerow(header)
+        done_path.write_text("", encoding="utf-8")
+        definition_path.write_text(json.dumps(definition, indent=4), encoding="utf-8")
+    print(
+        "[Sweep] {} runs to do, {} already done".format(
+            len(pending_runs), len(completed_runs)
+        )
+    )
+    with open(output_path, "a", encoding="utf-8", newline="") as output_file, open(
+        done_path, "a", encoding="utf-8"
+    ) as done_file, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        writer = csv.writer(output_file)
+        futures = [
+            executor.submit(execute_run, run, base_config, nb_steps, backend)
+            for run in pending_runs
+        ]
+        for future in as_completed(futures):
+            run, populations = future.result()
+            run_values = [run[column] for column in run_columns]
+            writer.writerows(
+                [*run_values, step, *population]
+                for step, population in enumerate(populations.tolist())
+            )
+            output_file.flush()
+            # a run is complete only once all its rows are on disk
+            done_file.write("{}\n".format(run["run_id"]))
+            done_file.flush()
+    return output_path
+
+
+def main(argv: Optional[list] = None):
+    """Entry point of the parameter sweep."""
+    parser = argparse.ArgumentParser(
+        description="Sweep the parameters of the preys-predators model."
+    )
+    parser.add_argument(
+        "sweep", type=Path, help="JSON file mapping parameters to lists of values"
+    )
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--output", type=Path, default=Path("sweep.csv"))
+    parser.add_argument(
+        "--config", type=Path, default=None, help="JSON file of model parameters"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run")
+    parser.add_argument(
+        "--backend", choices=sorted(batch_runner.MODEL_BACKENDS), default="agents"
+    )
+    args = parser.parse_args(argv)
+    with open(args.sweep, "r", encoding="utf-8") as sweep_file:
+        parameter_ranges = json.load(sweep_file)
+    run_sweep(
+        parameter_ranges=parameter_ranges,
+        nb_replicates=args.replicates,
+        nb_steps=args.steps,
+        output_path=args.output,
+        base_config=batch_runner.load_model_config(args.config),
+        max_workers=args.workers,
+        base_seed=args.seed,
+        backend=args.backend,
+    )
+    print("[Sweep] Populations written to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
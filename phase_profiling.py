@@ -0,0 +1,86 @@
+"""Measure the time spent in each phase of a step of the model.
+
+The model and its agents run their step as a list of phases (bound methods).
+When the model has a profiler, each phase is timed and counted under the
+phases which called it, for instance RandomActivation.step > Sheep.move.
+Without a profiler, the phases are called directly, so profiling costs a
+single attribute check per step when it is disabled.
+
+The profile can be queried with totals() or written in the folded stacks
+format (one "caller;callee microseconds" line per call path), which
+flamegraph.pl and speedscope read.
+"""
+import time
+from pathlib import Path
+
+
+class PhaseProfiler:
+    """Record the cumulative wall time and the number of calls of each phase."""
+
+    def __init__(self):
+        # names of the phases being run, from the outermost one
+        self.stack = []
+        # stats[call_path] = [cumulative seconds, number of calls]
+        self.stats = {}
+
+    def run_phases(self, phases: list):
+        """Run phases one after the other and record their durations.
+
+        Args:
+            phases (list): the methods to call, named after their __qualname__
+        """
+        for phase in phases:
+            self.run_named(phase.__qualname__, phase)
+
+    def run_named(self, name: str, phase):
+        """Run a phase and record its duration under a given name."""
+        self.stack.append(name)
+        start = time.perf_counter()
+        try:
+            phase()
+        finally:
+            stat = self.stats.setdefault(tuple(self.stack), [0.0, 0])
+            stat[0] += time.perf_counter() - start
+            stat[1] += 1
+            self.stack.pop()
+
+    def totals(self) -> dict:
+        """Sum the stats of each phase over all its call paths.
+
+        Returns:
+            totals (dict): (cumulative seconds, number of calls) of each phase,
+                e.g. totals["Sheep.move"], sorted by decreasing time
+        """
+        totals = {}
+        for call_path, (seconds, calls) in self.stats.items():
+            total = totals.setdefault(call_path[-1], [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+        return {
+            name: tuple(total)
+            for name, total in sorted(totals.items(), key=lambda item: -item[1][0])
+        }
+
+    def self_seconds(self) -> dict:
+        """Time spent in each call path outside of the phases it called."""
+        self_seconds = {
+            call_path: seconds for call_path, (seconds, _) in self.stats.items()
+        }
+        for call_path, (seconds, _) in self.stats.items():
+            if call_path[:-1] in self_seconds:
+                self_seconds[call_path[:-1]] -= seconds
+        return self_seconds
+
+    def write_folded(self, folded_path: Path):
+        """Write the profile in the folded stacks format, in microseconds."""
+        folded_path = Path(folded_path)
+        folded_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(folded_path, "w", encoding="utf-8") as folded_file:
+            for call_path, seconds in self.self_seconds().items():
+                folded_file.write(
+                    f"{';'.join(call_path)} {max(round(seconds * 1e6), 0)}\n"
+                )
+
+    def reset(self):
+        """Forget the recorded stats."""
+        self.stats.clear()
@@ -0,0 +1,192 @@
+"""Store the population time series of a model in a growable array.
+
+The model appends one row (nb_sheeps, nb_wolves, nb_grass, nb_sheeps_sick,
+nb_infections, nb_cures) per step in amortized constant time, and the rows are
+exposed as a NumPy view without any copy, which the GUI plots directly.
+
+For long runs, the series can be flushed to disk by chunks: once the buffer
+holds chunk_size rows, they are written to the flush file and the buffer
+starts over, so the memory used stays bounded. The format of the file is
+given by its suffix: .csv, .npz or .parquet (requires pyarrow). An .npz file
+cannot be appended to: each chunk is written to its own file next to it, and
+the chunks are merged into the .npz file when the series is closed.
+"""
+import csv
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+# the populations at the start of a step, then the number of infections and
+# cures since the previous row (the incidence and the recoveries)
+POPULATION_COLUMNS = (
+    "nb_sheeps",
+    "nb_wolves",
+    "nb_grass",
+    "nb_sheeps_sick",
+    "nb_infections",
+    "nb_cures",
+)
+FLUSH_FORMATS = (".csv", ".npz", ".parquet")
+
+
+def import_pyarrow() -> tuple:
+    """Import pyarrow, which is only required to flush to Parquet."""
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+    except ImportError as error:
+        raise ImportError("Flushing to Parquet requires pyarrow.") from error
+    return pyarrow, pyarrow.parquet
+
+
+class PopulationSeries:
+    """Columnar buffer of the populations of a model at each step."""
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        flush_path: Optional[Path] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        """Create an empty series.
+
+        Args:
+            capacity (int): initial number of rows of the buffer
+            flush_path (Path): file where to flush the rows (kept in memory if None)
+            chunk_size (int): number of rows per flushed chunk (capacity by default)
+        """
+        self.flush_path = None if flush_path is None else Path(flush_path)
+        if self.flush_path is not None:
+            if self.flush_path.suffix not in FLUSH_FORMATS:
+                raise ValueError(
+                    f"Unsupported flush format {self.flush_path.suffix}, "
+                    f"expected one of {FLUSH_FORMATS}"
+                )
+            if self.flush_path.suffix == ".parquet":
+                # fail before the run rather than at the first flush
+                import_pyarrow()
+            capacity = chunk_size or capacity
+            self.flush_path.parent.mkdir(parents=True, exist_ok=True)
+        self.data = np.zeros((capacity, len(POPULATION_COLUMNS)), dtype=np.int64)
+        # number of rows in the buffer
+        self.length = 0
+        # step of the first row of the buffer (the previous ones were flushed)
+        self.start_step = 0
+        self.nb_chunks = 0
+        self.parquet_writer = None
+
+    def __len__(self) -> int:
+        """Total number of rows appended, flushed ones included."""
+        return self.start_step + self.length
+
+    def append(self, population: tuple):
+        """Append the populations of a step."""
+        if self.length == self.data.shape[0]:
+            if self.flush_path is not None:
+                self.flush()
+            else:
+                self.data = np.concatenate([self.data, np.zeros_like(self.data)])
+        self.data[self.length] = population
+        self.length += 1
+
+    def view(self) -> np.ndarray:
+        """Return the rows in memory (a view, not a copy), one column per population."""
+        return self.data[: self.length]
+
+    def steps(self) -> np.ndarray:
+        """Return the steps of the rows in memory."""
+        return np.arange(self.start_step, self.start_step + self.length)
+
+    def column(self, name: str) -> np.ndarray:
+        """Return the rows in memory of one of the POPULATION_COLUMNS (a view)."""
+        return self.data[: self.length, POPULATION_COLUMNS.index(name)]
+
+    def restore(self, rows: np.ndarray, start_step: int, nb_chunks: int):
+        """Replace the content of the series by the rows of a checkpoint.
+
+        Args:
+            rows (np.ndarray): the rows which were in memory
+            start_step (int): the step of the first row
+            nb_chunks (int): the number of chunks already flushed
+        """
+        if rows.shape[0] > self.data.shape[0]:
+            self.data = np.zeros(
+                (rows.shape[0], len(POPULATION_COLUMNS)), dtype=np.int64
+            )
+        self.data[: rows.shape[0]] = rows
+        self.length = rows.shape[0]
+        self.start_step = start_step
+        self.nb_chunks = nb_chunks
+
+    def flush(self):
+        """Write the rows in memory to the flush file and empty the buffer."""
+        if self.flush_path is None or self.length == 0:
+            return
+        steps = self.steps()
+        rows = self.view()
+        if self.flush_path.suffix == ".csv":
+            mode = "a" if self.nb_chunks else "w"
+            with open(
+                self.flush_path, mode, encoding="utf-8", newline=""
+            ) as flush_file:
+                writer = csv.writer(flush_file)
+                if not self.nb_chunks:
+                    writer.writerow(["step", *POPULATION_COLUMNS])
+                writer.writerows(np.column_stack([steps, rows]).tolist())
+        elif self.flush_path.suffix == ".npz":
+            np.savez(
+                self.npz_chunk_path(self.nb_chunks),
+                step=steps,
+                **{name: rows[:, i] for i, name in enumerate(POPULATION_COLUMNS)},
+            )
+        else:
+            self.write_parquet_chunk(steps, rows)
+        self.nb_chunks += 1
+        self.start_step += self.length
+        self.length = 0
+
+    def npz_chunk_path(self, chunk_index: int) -> Path:
+        """Return the path of a chunk of an .npz flush file."""
+        return self.flush_path.with_name(
+            f"{self.flush_path.stem}_{chunk_index:05d}.npz"
+        )
+
+    def merge_npz_chunks(self):
+        """Merge the .npz chunks into the flush file, then delete them."""
+        chunk_paths = [self.npz_chunk_path(i) for i in range(self.nb_chunks)]
+        if not chunk_paths or not chunk_paths[0].exists():
+            # nothing was flushed, or the chunks are already merged
+            return
+        columns = {name: [] for name in ("step", *POPULATION_COLUMNS)}
+        for chunk_path in chunk_paths:
+            with np.load(chunk_path) as chunk:
+                for name, arrays in columns.items():
+                    arrays.append(chunk[name])
+        np.savez(
+            self.flush_path,
+            **{name: np.concatenate(arrays) for name, arrays in columns.items()},
+        )
+        for chunk_path in chunk_paths:
+            chunk_path.unlink()
+
+    def write_parquet_chunk(self, steps: np.ndarray, rows: np.ndarray):
+        """Write rows as a row group of the Parquet flush file."""
+        pa, pq = import_pyarrow()
+        table = pa.table(
+            {
+                "step": steps,
+                **{name: rows[:, i] for i, name in enumerate(POPULATION_COLUMNS)},
+            }
+        )
+        if self.parquet_writer is None:
+            self.parquet_writer = pq.ParquetWriter(self.flush_path, table.schema)
+        self.parquet_writer.write_table(table)
+
+    def close(self):
+        """Flush the remaining rows and close the flush file."""
+        self.flush()
+        if self.flush_path is not None and self.flush_path.suffix == ".npz":
+            self.merge_npz_chunks()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
@@ -1,13 +1,31 @@
 """Implement a sheep, wolves and grass predation model."""
-import uuid
-import logging
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
 import mesa
+import numpy as np
 
-from custom_errors import UnsupportedMovingMethodError
+from custom_errors import UnsupportedMovingMethodError, PopulationCountersError
+import event_tracing
+from phase_profiling import PhaseProfiler
+from population_series import PopulationSeries
+from staged_activation import (
+    COMPAT_ACTIVATION,
+    STAGED_ACTIVATION,
+    StagedSpeciesActivation,
+)
+from sparse_grid import SPARSE_GRID, SparseCounts, SparseMultiGrid
+from simulation_config import ModelConfig
 
-# pylint: disable=consider-using-f-string, line-too-long, logging-format-interpolation, logging-too-many-args
-
-logging.basicConfig(level=logging.WARNING)
+# Layout of a checkpoint directory: the scalar state in JSON and one .npy file
+# per array, which load_checkpoint() memory-maps
+CHECKPOINT_VERSION = 3
+CHECKPOINT_STATE_FILE = "state.json"
+# Offsets of the eight cells of the Moore neighbourhood, in the order of
+# mesa.space.MultiGrid.get_neighborhood()
+MOORE_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
 
 
 class Sheep(mesa.Agent):
@@ -24,72 +42,75 @@ class Sheep(mesa.Agent):
         # note: unique_id and model attributes inherit from the Agent class
         self.energy = energy
         self.eaten_by_wolf = False
+        # set to False as soon as the agent is registered as dead
+        self.alive = True
         # controls the Sheep agent's way to move on the grid (Random Walker by default)
         self.way_to_move = way_to_move
-        self.is_sick = self.random.random() > self.model.config["sheep_sanity_proba"]
-        logging.info(
-            "[Sheep] Creating a ship agent with ID {}, energy = {} and is_sick = {}".format(
-                unique_id, energy, self.is_sick
+        # index of the random numbers of the agent in model.draws (set at each step)
+        self.draw_slot = None
+        # cell of the sheep before its last move (used by the staged activation)
+        self.start_pos = None
+        self.is_sick = self.random.random() > self.model.config.sheep_sanity_proba
+        if self.model.tracer is not None:
+            self.model.tracer.record(
+                event_tracing.BIRTH, self, energy=energy, is_sick=self.is_sick
             )
-        )
+
+    def step_phases(self) -> list:
+        """List the methods run by step(), in their order (used when profiling)."""
+        if self.model.config.add_sickness:
+            return [self.move, self.update_sickness, self.die, self.eat, self.reproduce]
+        return [self.move, self.die, self.eat, self.reproduce]
 
     def step(self):
         """Generic step for a sheep."""
-        if not self in self.model.died_agents:
-            # this order matters: see the doc
-            self.move()
-            if self.model.config["add_sickness"]:
-                self.update_sickness()
-            # note: die() method does not mean the current agent will die at this step
-            self.die()
-            self.eat()
-            self.reproduce()
+        if not self.alive:
+            return
+        if self.model.profiler is not None:
+            self.model.profiler.run_phases(self.step_phases())
+            return
+        # this order matters: see the doc (and keep step_phases() in sync)
+        self.move()
+        if self.model.config.add_sickness:
+            self.update_sickness()
+        # note: die() method does not mean the current agent will die at this step
+        self.die()
+        self.eat()
+        self.reproduce()
 
     def move(self):
         """When a sheep moves on the grid."""
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
         if self.way_to_move == "random":
             # pick a new position at random
-            new_position = self.random.choice(possible_steps)
+            new_position = self.model.random_neighbour(
+                self.pos, self.model.draws.move[self.draw_slot]
+            )
         else:
             raise UnsupportedMovingMethodError
 
-        self.model.grid.move_agent(self, new_position)
+        self.start_pos = self.pos
+        self.model.move_agent(self, new_position)
         # when a sheep moves, it looses an energy unit
-        self.energy -= self.model.config["sheep_move_loss"]
-        logging.debug(
-            "[Sheep] Sheep agent with ID {} has remaining energy of {}".format(
-                self.unique_id, self.energy
-            )
-        )
+        self.energy -= self.model.config.sheep_move_loss
 
     def eat(self):
         """When a sheep eats grass."""
-        cellmates = self.model.grid.get_cell_list_contents([self.pos])
-        for agent in cellmates:
-            if isinstance(agent, Patch) and agent.grass:
-                # a surrounding Patch agent has grass to provide
-                agent.grass = False
-                # the Sheep agent eats the grass and gains energy
-                self.energy += self.model.config["sheep_gain_from_grass"]
-                logging.info(
-                    "[Sheep] Sheep agent with ID {} eats a Grass patch. Remaining energy is {}".format(
-                        self.unique_id, self.energy
-                    )
+        if self.model.grass_field.eat(self.pos):
+            # the Sheep agent eats the grass and gains energy
+            self.energy += self.model.config.sheep_gain_from_grass
+            if self.model.tracer is not None:
+                self.model.tracer.record(
+                    event_tracing.MEAL, self, food="grass", energy=self.energy
                 )
-                break
 
     def reproduce(self):
         """When sheeps breed."""
-        random_number = self.random.random()
-        if random_number < self.model.config["sheep_reproduction_rate"]:
-            new_id = uuid.uuid1()
+        random_number = self.model.draws.reproduce[self.draw_slot]
+        if random_number < self.model.config.sheep_reproduction_rate:
             new_sheep = Sheep(
-                unique_id=new_id.int,
+                unique_id=self.model.next_id(),
                 model=self.model,
-                energy=self.model.config["sheep_init_energy"],
+                energy=self.model.config.sheep_init_energy,
             )
             new_sheep.pos = self.pos
             # note: we could also make the new sheep pop on a surrounding grid cell
@@ -97,46 +118,80 @@ class Sheep(mesa.Agent):
 
     def die(self):
         """When a sheep dies either from being eaten by a wolf or by natural death."""
-        if (
-            self.energy < 0 or self.eaten_by_wolf
-        ) and not self in self.model.died_agents:
-            self.model.died_agents.append(self)
-            logging.info(
-                "[Sheep] Sheep agent with ID {} has died.".format(self.unique_id)
-            )
-        if self.model.config["add_sickness"]:
-            if not self in self.model.died_agents and self.is_sick:
+        self.die_of_energy()
+        if self.model.config.add_sickness:
+            if self.alive and self.is_sick:
                 dies_from_sickness = (
-                    self.random.random() < self.model.config["sickness_severity"]
+                    self.model.draws.sickness_death[self.draw_slot]
+                    < self.model.config.sickness_severity
                 )
                 if dies_from_sickness:
-                    self.model.died_agents.append(self)
-                    logging.info(
-                        "[Sheep] Sheep agent with ID {} has died from sickness.".format(
-                            self.unique_id
-                        )
-                    )
+                    self.die_of_sickness()
+
+    def die_of_energy(self):
+        """When a sheep has been eaten by a wolf or has no energy left."""
+        if (
+            self.energy < 0 or self.eaten_by_wolf
+        ) and self.alive:
+            self.model.register_death(self)
+            if self.model.tracer is not None:
+                self.model.tracer.record(
+                    event_tracing.DEATH,
+                    self,
+                    cause="wolf" if self.eaten_by_wolf else "energy",
+                )
+
+    def die_of_sickness(self):
+        """Register the death of the sheep from its sickness."""
+        self.model.register_death(self)
+        if self.model.tracer is not None:
+            self.model.tracer.record(event_tracing.DEATH, self, cause="sickness")
+
+    @staticmethod
+    def batch_update_sickness(model, sheeps: list):
+        """Staged activation: cure, infect and kill by sickness all the sheeps.
+
+        The random activation has no batched path: each sheep runs
+        update_sickness() in its own step.
+        """
+        model.run_epidemic(sheeps)
+
+    @staticmethod
+    def batch_die(model, sheeps: list):
+        """Staged activation: the sickness deaths are handled by run_epidemic()."""
+        for sheep in sheeps:
+            sheep.die_of_energy()
 
     def update_sickness(self):
         """Method used to determine if the agent gets infected by sickness at this step."""
         if self.is_sick:
             heal_from_sickness = (
-                self.random.random() < self.model.config["sheep_cure_proba"]
+                self.model.draws.cure[self.draw_slot]
+                < self.model.config.sheep_cure_proba
             )
             if heal_from_sickness:
-                self.is_sick = False
+                self.model.set_sickness(self, False)
+                if self.model.tracer is not None:
+                    self.model.tracer.record(event_tracing.CURE, self)
         if not self.is_sick:
-            number_surrounding_agents_infected = 0
-            cellmates = self.model.grid.get_cell_list_contents([self.pos])
-            for agent in cellmates:
-                if isinstance(agent, Sheep) and agent.is_sick:
-                    number_surrounding_agents_infected += 1
+            number_surrounding_agents_infected = int(
+                self.model.occupancy.nb_sick_sheeps[self.pos]
+            )
+            # as with uniform(0, n) < n * p before, the probability of getting
+            # infected is p as soon as there is n > 0 infected cellmate
             get_sickness = (
-                self.random.uniform(0, number_surrounding_agents_infected)
-                < number_surrounding_agents_infected
-                * self.model.config["proba_sickness_transmission"]
+                number_surrounding_agents_infected > 0
+                and self.model.draws.infection[self.draw_slot]
+                < self.model.config.proba_sickness_transmission
             )
-            self.is_sick = get_sickness
+            if get_sickness:
+                self.model.set_sickness(self, True)
+                if self.model.tracer is not None:
+                    self.model.tracer.record(
+                        event_tracing.INFECTION,
+                        self,
+                        nb_infected_cellmates=number_surrounding_agents_infected,
+                    )
 
 
 class Wolf(mesa.Agent):
@@ -145,91 +200,237 @@ class Wolf(mesa.Agent):
     def __init__(self, unique_id, model, energy, way_to_move: str = "random"):
         super().__init__(unique_id, model)
         self.energy = energy
-        logging.info(
-            "[Wolf] Creating a wolf agent with ID {} and energy = {}".format(
-                unique_id, energy
-            )
-        )
+        self.alive = True
+        # index of the random numbers of the agent in model.draws (set at each step)
+        self.draw_slot = None
+        if self.model.tracer is not None:
+            self.model.tracer.record(event_tracing.BIRTH, self, energy=energy)
         self.way_to_move = way_to_move
 
+    def step_phases(self) -> list:
+        """List the methods run by step(), in their order (used when profiling)."""
+        return [self.move, self.die, self.eat, self.reproduce]
+
     def step(self):
         """Generic step for wolf agents."""
-        if not self in self.model.died_agents:
-            # this order matters: see the doc
-            self.move()
-            self.die()
-            self.eat()
-            self.reproduce()
+        if not self.alive:
+            return
+        if self.model.profiler is not None:
+            self.model.profiler.run_phases(self.step_phases())
+            return
+        # this order matters: see the doc (and keep step_phases() in sync)
+        self.move()
+        self.die()
+        self.eat()
+        self.reproduce()
 
     def move(self):
         """When a wolf moves on the grid."""
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
         if self.way_to_move == "random":
             # pick a new position at random
-            new_position = self.random.choice(possible_steps)
+            new_position = self.model.random_neighbour(
+                self.pos, self.model.draws.move[self.draw_slot]
+            )
         else:
             raise UnsupportedMovingMethodError
 
-        self.model.grid.move_agent(self, new_position)
-        self.energy -= self.model.config["wolf_move_loss"]
+        self.model.move_agent(self, new_position)
+        self.energy -= self.model.config.wolf_move_loss
 
     def eat(self):
         """When a wolf eats a sheep."""
-        cellmates = self.model.grid.get_cell_list_contents([self.pos])
-        for agent in cellmates:
-            if isinstance(agent, Sheep) and not agent in self.model.died_agents:
-                self.energy += self.model.config["wolf_gain_from_sheep"]
-                logging.info(
-                    "[Wolf] Wolf agent with ID {} has eaten Sheep agent with ID {}.".format(
-                        self.unique_id, agent.unique_id
-                    )
-                )
-                agent.eaten_by_wolf = True
-                agent.die()
-                break
+        prey = self.model.occupancy.first_live_sheep(self.pos)
+        if prey is not None:
+            self.energy += self.model.config.wolf_gain_from_sheep
+            if self.model.tracer is not None:
+                self.model.tracer.record(event_tracing.MEAL, self, prey=prey.unique_id)
+            prey.eaten_by_wolf = True
+            prey.die()
 
     def reproduce(self):
         """When wolves breed."""
-        random_number = self.random.random()
-        if random_number < self.model.config["wolf_reproduction_rate"]:
-            new_id = uuid.uuid1()
+        random_number = self.model.draws.reproduce[self.draw_slot]
+        if random_number < self.model.config.wolf_reproduction_rate:
             new_wolf = Wolf(
-                unique_id=new_id.int,
+                unique_id=self.model.next_id(),
                 model=self.model,
-                energy=self.model.config["wolf_init_energy"],
+                energy=self.model.config.wolf_init_energy,
             )
             new_wolf.pos = self.pos
             self.model.born_agents.append(new_wolf)
 
     def die(self):
         """When a wolf dies of natural death."""
-        if self.energy < 0 and not self in self.model.died_agents:
-            self.model.died_agents.append(self)
-            logging.info(
-                "[Wolf] Wolf agent with ID {} has died.".format(self.unique_id)
-            )
+        if self.energy < 0 and self.alive:
+            self.model.register_death(self)
+            if self.model.tracer is not None:
+                self.model.tracer.record(event_tracing.DEATH, self, cause="energy")
 
 
-class Patch(mesa.Agent):
-    """Handle the grass."""
+class GrassField:
+    """Handle the grass of the whole grid as two arrays.
 
-    def __init__(self, unique_id, model, grass: bool):
-        super().__init__(unique_id, model)
-        # the grass attribute is True if the current Patch agent has grass to offer sheeps
-        self.grass = grass
-        # the count_no_grass attributes is used for grass regeneration
-        self.count_no_grass = 0
+    Each cell of the grid holds a patch of grass. Instead of one agent per cell,
+    the state of all the patches is stored in two arrays of shape
+    (grid_width, grid_height) indexed by the agents positions. Both take one
+    byte per cell (as long as the regrowth time is below 255 steps), so that
+    grids of millions of cells fit in memory.
+    """
+
+    def __init__(self, width: int, height: int, regrowth_time: int):
+        # grass[x, y] is True if the patch at (x, y) has grass to offer sheeps
+        self.grass = np.ones((width, height), dtype=bool)
+        # count_no_grass[x, y] is used for grass regeneration, it never exceeds
+        # regrowth_time + 1 so it takes the smallest unsigned type holding it
+        self.count_no_grass = np.zeros(
+            (width, height), dtype=np.min_scalar_type(regrowth_time + 1)
+        )
+        self.regrowth_time = regrowth_time
+        # number of patches with grass, kept up to date by eat() and step()
+        self.nb_grass = width * height
+
+    def eat(self, pos: tuple) -> bool:
+        """Eat the grass of a patch if there is some.
+
+        Returns:
+            eaten (bool): True if the patch had grass
+        """
+        if not self.grass[pos]:
+            return False
+        self.grass[pos] = False
+        self.nb_grass -= 1
+        return True
+
+    def eat_cells(self, cells: np.ndarray):
+        """Eat the grass of some patches given by their flat index.
+
+        The patches must have grass and the indices must be distinct.
+        """
+        self.grass.reshape(-1)[cells] = False
+        self.nb_grass -= cells.shape[0]
 
     def step(self):
-        """Handle a generic step for grass agents."""
-        if self.count_no_grass > self.model.config["grass_regrowth_time"]:
-            self.count_no_grass = 0
-            self.grass = True
+        """Handle a generic step for all the patches at once."""
+        # a patch waiting for regrowth has no grass; the updates are done in
+        # place over whole arrays, which is faster than indexing by a mask
+        regrown = self.count_no_grass > self.regrowth_time
+        self.count_no_grass *= ~regrown
+        self.grass |= regrown
+        self.nb_grass += int(np.count_nonzero(regrown))
+        self.count_no_grass += ~self.grass
+
+    def count_grass(self) -> int:
+        """Return the number of patches with grass."""
+        return self.nb_grass
+
+
+class StepDraws:
+    """Random numbers drawn in bulk for the agents which act during a step.
+
+    At the start of each step, every agent of the scheduler gets a slot
+    (agent.draw_slot) and one number in [0, 1) of each stream is drawn for
+    every slot. An agent uses at most one number of each stream per step, so
+    it reads its numbers by indexing instead of calling a random generator.
+    The streams are Python lists: indexing a NumPy array element by element
+    is slower than calling random.random().
+    """
+
+    STREAMS = ("move", "reproduce", "cure", "infection", "sickness_death")
+    __slots__ = (*STREAMS, "arrays")
+
+    def __init__(self):
+        for stream in self.STREAMS:
+            setattr(self, stream, [])
+        # the same numbers as an array, one row per stream (for batched stages)
+        self.arrays = np.empty((len(self.STREAMS), 0))
+
+    def draw(self, rng: np.random.Generator, nb_slots: int):
+        """Draw the numbers of all the streams for nb_slots agents."""
+        self.arrays = rng.random((len(self.STREAMS), nb_slots))
+        for stream, numbers in zip(self.STREAMS, self.arrays):
+            setattr(self, stream, numbers.tolist())
 
-        if not self.grass:
-            self.count_no_grass += 1
+    def array(self, stream: str) -> np.ndarray:
+        """Return the numbers of a stream as an array indexed by slot."""
+        return self.arrays[self.STREAMS.index(stream)]
+
+
+class OccupancyIndex:
+    """Index the animals of each cell of the grid by species.
+
+    The counts arrays of shape (grid_width, grid_height) follow the grid: an
+    animal registered as dead is counted until it is removed from the grid at
+    the end of the step. The buckets only hold the live animals of each cell,
+    in the order in which they entered the cell (the order of the grid cell
+    lists), and a cell without live animal of a species has no bucket.
+    With sparse=True, the counts are SparseCounts dictionaries instead of
+    arrays, which only hold the occupied cells.
+    """
+
+    def __init__(self, width: int, height: int, sparse: bool = False):
+        self.height = height
+        self.sparse = sparse
+        if sparse:
+            self.nb_sheeps = SparseCounts()
+            self.nb_sick_sheeps = SparseCounts()
+            self.nb_wolves = SparseCounts()
+        else:
+            self.nb_sheeps = np.zeros((width, height), dtype=np.int64)
+            self.nb_sick_sheeps = np.zeros((width, height), dtype=np.int64)
+            self.nb_wolves = np.zeros((width, height), dtype=np.int64)
+        # live_sheeps[pos] is an insertion-ordered dict of the live sheeps at pos
+        self.live_sheeps = {}
+        self.live_wolves = {}
+
+    def place(self, agent: mesa.Agent, pos: tuple):
+        """Index an agent which enters a cell."""
+        if isinstance(agent, Sheep):
+            self.nb_sheeps[pos] += 1
+            if agent.is_sick:
+                self.nb_sick_sheeps[pos] += 1
+            buckets = self.live_sheeps
+        elif isinstance(agent, Wolf):
+            self.nb_wolves[pos] += 1
+            buckets = self.live_wolves
+        else:
+            return
+        if agent.alive:
+            buckets.setdefault(pos, {})[agent] = None
+
+    def remove(self, agent: mesa.Agent, pos: tuple):
+        """Unindex an agent which leaves a cell."""
+        if isinstance(agent, Sheep):
+            self.nb_sheeps[pos] -= 1
+            if agent.is_sick:
+                self.nb_sick_sheeps[pos] -= 1
+        elif isinstance(agent, Wolf):
+            self.nb_wolves[pos] -= 1
+        self.discard_live(agent, pos)
+
+    def discard_live(self, agent: mesa.Agent, pos: Optional[tuple] = None):
+        """Remove an agent from the live animals of its cell."""
+        if isinstance(agent, Sheep):
+            buckets = self.live_sheeps
+        elif isinstance(agent, Wolf):
+            buckets = self.live_wolves
+        else:
+            return
+        pos = agent.pos if pos is None else pos
+        bucket = buckets.get(pos)
+        if bucket is not None:
+            bucket.pop(agent, None)
+            if not bucket:
+                del buckets[pos]
+
+    def first_live_sheep(self, pos: tuple) -> Optional[Sheep]:
+        """Return the live sheep which entered the cell first, if any."""
+        bucket = self.live_sheeps.get(pos)
+        return next(iter(bucket)) if bucket else None
+
+    def first_live_wolf(self, pos: tuple) -> Optional[Wolf]:
+        """Return the live wolf which entered the cell first, if any."""
+        bucket = self.live_wolves.get(pos)
+        return next(iter(bucket)) if bucket else None
 
 
 class Shepherd(mesa.Agent):
@@ -249,24 +450,19 @@ class Shepherd(mesa.Agent):
 
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
-        logging.info(
-            "[Shepherd] Creating a shepherd agent with ID {}".format(unique_id)
-        )
+        self.alive = True
 
     def step(self):
         """Generic step for the Shepherd agent."""
-        if not self in self.model.died_agents:
+        if self.alive:
             # this order matters: see the doc
             self.move()
             self.kill_wolf()
 
     def move(self):
         """When the shepherd moves on the grid."""
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
-        new_position = self.random.choice(possible_steps)
-        self.model.grid.move_agent(self, new_position)
+        new_position = self.model.random_neighbour(self.pos, self.random.random())
+        self.model.move_agent(self, new_position)
         self.protect_surrounding_sheeps()
 
     def protect_surrounding_sheeps(self):
@@ -275,120 +471,658 @@ class Shepherd(mesa.Agent):
         for agent in self.model.scheduler.agents:
             if isinstance(agent, Sheep) and agent.protected_by_shepherd:
                 agent.protected_by_shepherd = False
-        cellmates = self.model.grid.get_cell_list_contents([self.pos])
-        for agent in cellmates:
-            if isinstance(agent, Sheep):
-                agent.protected_by_shepherd = True
+        for agent in self.model.occupancy.live_sheeps.get(self.pos, ()):
+            agent.protected_by_shepherd = True
 
     def kill_wolf(self):
         """When the shepherd tries to kill a surrounding wolf."""
-        cellmates = self.model.grid.get_cell_list_contents([self.pos])
-        for agent in cellmates:
-            if isinstance(agent, Wolf):
-                logging.info(
-                    "[Shepherd] Shepherd agent with ID {} has killed Wolf agent with ID {}.".format(
-                        self.unique_id, agent.unique_id
-                    )
-                )
-                agent.killed_by_shepherd = True
-                agent.die()
-                break
+        wolf = self.model.occupancy.first_live_wolf(self.pos)
+        if wolf is not None:
+            wolf.killed_by_shepherd = True
+            wolf.die()
 
 
 class PreysPredatorsModel(mesa.Model):
-    """Base class for the Preys-Predators model."""
+    """Base class for the Preys-Predators model.
 
-    def __init__(self, config: dict):
+    The agents IDs are handed out by the model counter (see mesa.Model.next_id),
+    so two models built with the same config and seed evolve identically.
+    """
+
+    def __init__(
+        self,
+        config,
+        seed: Optional[int] = None,
+        trace_path: Optional[Path] = None,
+        check_counters: bool = False,
+        population_series: Optional[PopulationSeries] = None,
+        profile: bool = False,
+    ):
         super().__init__()
-        self.config = config
-        self.grid = mesa.space.MultiGrid(
-            self.config["grid_width"], self.config["grid_height"], True
+        if seed is not None:
+            # seed the random number generator shared by all the agents
+            self.reset_randomizer(seed)
+        # the parameters are bound once, as attributes (see ModelConfig)
+        self.config = ModelConfig.coerce(config)
+        # generator of the random numbers of the agents steps, drawn in bulk
+        # (the scheduler order and the births still use self.random)
+        self.rng = np.random.default_rng(seed)
+        self.draws = StepDraws()
+        # the events are only recorded when a trace file is given
+        self.tracer = None
+        if trace_path is not None:
+            self.tracer = event_tracing.EventTracer(self, trace_path)
+        # the phases of the steps are only timed when profiling
+        self.profiler = PhaseProfiler() if profile else None
+        self.grid = self.create_grid()
+        self.scheduler = self.create_scheduler()
+        # populations at each step (in memory unless the series flushes to disk)
+        self.population_series = (
+            PopulationSeries() if population_series is None else population_series
         )
-        self.scheduler = mesa.time.RandomActivation(self)
-        self.datacollector = mesa.DataCollector(
-            model_reporters={"population": compute_population}
+        # Fill the grid with grass patches
+        self.grass_field = self.create_grass_field()
+        # per-cell occupancy of the animals, kept in sync with the grid
+        self.occupancy = OccupancyIndex(
+            self.config.grid_width,
+            self.config.grid_height,
+            self.config.grid_storage == SPARSE_GRID,
         )
         self.running = False
-        self.died_agents = []
+        # insertion-ordered registry of the agents which died during the step
+        self.died_agents = {}
         self.born_agents = []
+        # population counters, updated on births, deaths and sickness changes
+        self.nb_sheeps = 0
+        self.nb_wolves = 0
+        self.nb_sheeps_sick = 0
+        # number of infections and cures since the last population collection
+        self.nb_infections = 0
+        self.nb_cures = 0
+        # debug mode: compare the counters with a full scan at each collection
+        self.check_counters = check_counters
         self.init_all_agents()
         print("[Model] Created a new Preys-Predators model successfully.")
-        print("[Model] Sickness added: ", str(self.config["add_sickness"]))
-        print("[Model] Sickness severity: ", str(self.config["sickness_severity"]))
+        print("[Model] Sickness added: ", str(self.config.add_sickness))
+        print("[Model] Sickness severity: ", str(self.config.sickness_severity))
         print(
             "[Model] Probability of transmitting the sickness: ",
-            str(self.config["proba_sickness_transmission"]),
+            str(self.config.proba_sickness_transmission),
         )
         print(
             "[Model] Probability for sheeps of being born sane: ",
-            str(self.config["sheep_sanity_proba"]),
+            str(self.config.sheep_sanity_proba),
         )
         print(
             "[Model] Probability of healing from sickness: ",
-            str(self.config["sheep_cure_proba"]),
+            str(self.config.sheep_cure_proba),
         )
 
+    def create_grid(self):
+        """Create the toroidal grid given by the "grid_storage" parameter."""
+        if self.config.grid_storage == SPARSE_GRID:
+            return SparseMultiGrid(self.config.grid_width, self.config.grid_height)
+        return mesa.space.MultiGrid(
+            self.config.grid_width, self.config.grid_height, True
+        )
+
+    def create_grass_field(self) -> GrassField:
+        """Create the grass patches of the grid."""
+        return GrassField(
+            self.config.grid_width,
+            self.config.grid_height,
+            self.config.grass_regrowth_time,
+        )
+
+    def create_scheduler(self) -> mesa.time.BaseScheduler:
+        """Create the scheduler given by the "activation" parameter."""
+        if self.config.activation in (STAGED_ACTIVATION, COMPAT_ACTIVATION):
+            stages = ["move", "die", "eat", "reproduce"]
+            if self.config.add_sickness:
+                stages.insert(1, "update_sickness")
+            return StagedSpeciesActivation(
+                self,
+                stages,
+                [Sheep, Wolf],
+                compat=self.config.activation == COMPAT_ACTIVATION,
+            )
+        return mesa.time.RandomActivation(self)
+
     def init_all_agents(self):
         """Create the initial population."""
-        # Fill the grid with grass patches
-        for i in range(self.grid.width):
-            for j in range(self.grid.height):
-                unique_id = uuid.uuid1()
-                patch = Patch(grass=True, unique_id=unique_id.int, model=self)
-                self.scheduler.add(patch)
-                self.grid.place_agent(patch, (i, j))
         # Create and place the sheeps
-        for _ in range(self.config["init_nb_sheeps"]):
-            unique_id = uuid.uuid1()
+        for _ in range(self.config.init_nb_sheeps):
             sheep = Sheep(
-                energy=self.config["sheep_init_energy"],
-                unique_id=unique_id.int,
+                energy=self.config.sheep_init_energy,
+                unique_id=self.next_id(),
                 model=self,
             )
-            self.scheduler.add(sheep)
-            sheep_x_coord = self.random.randrange(self.grid.width)
-            sheep_y_coord = self.random.randrange(self.grid.height)
-            self.grid.place_agent(sheep, (sheep_x_coord, sheep_y_coord))
+            self.add_agent(sheep, self.random_position())
         # Create and place the wolves
-        for _ in range(self.config["init_nb_wolves"]):
-            unique_id = uuid.uuid1()
+        for _ in range(self.config.init_nb_wolves):
             wolf = Wolf(
-                energy=self.config["wolf_init_energy"],
-                unique_id=unique_id.int,
+                energy=self.config.wolf_init_energy,
+                unique_id=self.next_id(),
                 model=self,
             )
-            self.scheduler.add(wolf)
-            wolf_x_coord = self.random.randrange(self.grid.width)
-            wolf_y_coord = self.random.randrange(self.grid.height)
-            self.grid.place_agent(wolf, (wolf_x_coord, wolf_y_coord))
+            self.add_agent(wolf, self.random_position())
+
+    def random_position(self) -> tuple:
+        """Draw the position of an agent of the initial population."""
+        pos_x = self.random.randrange(self.grid.width)
+        pos_y = self.random.randrange(self.grid.height)
+        return pos_x, pos_y
+
+    def draw_random_numbers(self):
+        """Give a slot to each agent and draw the random numbers of the step."""
+        agents = self.scheduler.agents
+        for slot, agent in enumerate(agents):
+            agent.draw_slot = slot
+        self.draws.draw(self.rng, len(agents))
+
+    def update_counters(self, agent: mesa.Agent, change: int):
+        """Add (change=1) or remove (change=-1) an agent from the counters."""
+        if isinstance(agent, Sheep):
+            self.nb_sheeps += change
+            if agent.is_sick:
+                self.nb_sheeps_sick += change
+        elif isinstance(agent, Wolf):
+            self.nb_wolves += change
+
+    def add_agent(self, agent: mesa.Agent, pos: tuple):
+        """Put an agent on the grid and in the scheduler."""
+        self.scheduler.add(agent)
+        self.grid.place_agent(agent, pos)
+        self.occupancy.place(agent, pos)
+        self.update_counters(agent, 1)
+
+    def remove_agent(self, agent: mesa.Agent):
+        """Take an agent off the grid and out of the scheduler."""
+        self.scheduler.remove(agent)
+        self.occupancy.remove(agent, agent.pos)
+        self.grid.remove_agent(agent)
+        self.update_counters(agent, -1)
+
+    def random_neighbour(self, pos: tuple, draw: float) -> tuple:
+        """Return the neighbour of pos (Moore, torus) selected by a draw in [0, 1).
+
+        The neighbour is computed from the offsets, without building the list
+        of the neighbours, except on grids narrower than 3 cells where some
+        neighbours are the same cell (the grid removes these duplicates).
+        """
+        if self.grid.width < 3 or self.grid.height < 3:
+            neighbours = self.grid.get_neighborhood(
+                pos, moore=True, include_center=False
+            )
+            return neighbours[int(draw * len(neighbours))]
+        offset_x, offset_y = MOORE_OFFSETS[int(draw * 8)]
+        return (
+            (pos[0] + offset_x) % self.grid.width,
+            (pos[1] + offset_y) % self.grid.height,
+        )
+
+    def move_agent(self, agent: mesa.Agent, pos: tuple):
+        """Move an agent on the grid and in the occupancy index."""
+        self.occupancy.remove(agent, agent.pos)
+        self.grid.move_agent(agent, pos)
+        self.occupancy.place(agent, pos)
+
+    def set_sickness(self, sheep: Sheep, is_sick: bool):
+        """Make a sheep sick or cure it, keeping the counters up to date."""
+        if sheep.is_sick == is_sick:
+            return
+        change = 1 if is_sick else -1
+        sheep.is_sick = is_sick
+        self.nb_sheeps_sick += change
+        self.occupancy.nb_sick_sheeps[sheep.pos] += change
+        if is_sick:
+            self.nb_infections += 1
+        else:
+            self.nb_cures += 1
+
+    def sheep_cells(self, sheeps: list) -> tuple:
+        """Return the flat index of the cell of each sheep and of its start cell.
+
+        The sheeps which are dead at the start of the stage were eaten before
+        moving, so their start cell is their cell.
+        """
+        nb_sheeps = len(sheeps)
+        height = self.grid.height
+        cells = np.fromiter(
+            (sheep.pos[0] * height + sheep.pos[1] for sheep in sheeps),
+            dtype=np.int64,
+            count=nb_sheeps,
+        )
+        start_positions = [
+            sheep.start_pos if sheep.alive else sheep.pos for sheep in sheeps
+        ]
+        start_cells = np.fromiter(
+            (pos_x * height + pos_y for pos_x, pos_y in start_positions),
+            dtype=np.int64,
+            count=nb_sheeps,
+        )
+        return cells, start_cells
+
+    def sick_cell_ranks(
+        self,
+        sheeps: list,
+        slots: np.ndarray,
+        was_sick: np.ndarray,
+        may_be_infected: np.ndarray,
+    ) -> np.ndarray:
+        """Return the activation ranks of the sick sheeps, and of the sheeps which
+        may get infected standing on a cell where a sick sheep is or started the
+        step: the other ones have no sick cellmate."""
+        sick_ranks = np.flatnonzero(was_sick)
+        sick_positions = set()
+        for i in sick_ranks.tolist():
+            sheep = sheeps[i]
+            sick_positions.add(sheep.pos)
+            if sheep.alive:
+                sick_positions.add(sheep.start_pos)
+        live_sheeps = self.occupancy.live_sheeps
+        cellmate_slots = np.fromiter(
+            (
+                sheep.draw_slot
+                for pos in sick_positions
+                for sheep in live_sheeps.get(pos, ())
+            ),
+            dtype=np.int64,
+        )
+        slot_ranks = np.zeros(slots.max() + 1, dtype=np.int64)
+        slot_ranks[slots] = np.arange(slots.shape[0])
+        cellmate_ranks = slot_ranks[cellmate_slots]
+        return np.union1d(sick_ranks, cellmate_ranks[may_be_infected[cellmate_ranks]])
+
+    def run_epidemic(self, sheeps: list):
+        """Cure, infect and kill by sickness a population of sheeps at once.
+
+        This is Sheep.update_sickness() followed by the sickness part of
+        Sheep.die() for all the sheeps, with the same random numbers. Each
+        sheep meets its sick cellmates as with the random activation (see
+        count_sick_cellmates()), once the sheeps activated before it are cured
+        or infected. It is only run by the staged activation: with the random
+        activation, each sheep updates its sickness in its own step.
+
+        Args:
+            sheeps (list): the sheeps, in their activation order (the dead ones
+                are only counted as cellmates)
+        """
+        if not sheeps:
+            return
+        nb_sheeps = len(sheeps)
+        slots = np.fromiter(
+            (sheep.draw_slot for sheep in sheeps), dtype=np.int64, count=nb_sheeps
+        )
+        alive = np.fromiter(
+            (sheep.alive for sheep in sheeps), dtype=bool, count=nb_sheeps
+        )
+        was_sick = np.fromiter(
+            (sheep.is_sick for sheep in sheeps), dtype=bool, count=nb_sheeps
+        )
+        cured = (
+            alive
+            & was_sick
+            & (self.draws.array("cure")[slots] < self.config.sheep_cure_proba)
+        )
+        may_be_infected = (
+            alive
+            & (~was_sick | cured)
+            & (
+                self.draws.array("infection")[slots]
+                < self.config.proba_sickness_transmission
+            )
+        )
+        ranks = self.sick_cell_ranks(sheeps, slots, was_sick, may_be_infected)
+        cells, start_cells = self.sheep_cells([sheeps[i] for i in ranks.tolist()])
+        # a sheep infected by the stage is a sick cellmate for the sheeps
+        # activated after it: since these only depend on the sheeps activated
+        # before them, the infections are updated until they no longer change
+        infected = np.zeros(nb_sheeps, dtype=bool)
+        while True:
+            is_sick = (was_sick & ~cured) | infected
+            nb_sick_cellmates = np.zeros(nb_sheeps, dtype=np.int64)
+            nb_sick_cellmates[ranks] = count_sick_cellmates(
+                ranks, cells, start_cells, is_sick[ranks], was_sick[ranks]
+            )
+            new_infected = may_be_infected & (nb_sick_cellmates > 0)
+            if np.array_equal(new_infected, infected):
+                break
+            infected = new_infected
+        dies = (
+            alive
+            & is_sick
+            & (
+                self.draws.array("sickness_death")[slots]
+                < self.config.sickness_severity
+            )
+        )
+        for i in np.flatnonzero(cured).tolist():
+            self.set_sickness(sheeps[i], False)
+            if self.tracer is not None:
+                self.tracer.record(event_tracing.CURE, sheeps[i])
+        for i in np.flatnonzero(infected).tolist():
+            self.set_sickness(sheeps[i], True)
+            if self.tracer is not None:
+                self.tracer.record(
+                    event_tracing.INFECTION,
+                    sheeps[i],
+                    nb_infected_cellmates=int(nb_sick_cellmates[i]),
+                )
+        for i in np.flatnonzero(dies).tolist():
+            # the sheeps without energy die of it in the die stage
+            if sheeps[i].energy >= 0:
+                sheeps[i].die_of_sickness()
+
+    def register_death(self, agent: mesa.Agent):
+        """Mark an agent as dead so that it is removed at the end of the step."""
+        agent.alive = False
+        self.died_agents[agent] = None
+        self.occupancy.discard_live(agent)
 
     def kill_agents(self):
         """Handle the death of agents."""
         while self.died_agents:
-            agent = self.died_agents.pop()
-            self.scheduler.remove(agent)
-            self.grid.remove_agent(agent)
+            # popitem() is LIFO: the agents are removed in a deterministic order
+            agent, _ = self.died_agents.popitem()
+            self.remove_agent(agent)
 
     def give_birth_to_agents(self):
         """Create new agents (reproduction)."""
         while self.born_agents:
             agent = self.born_agents.pop()
-            self.scheduler.add(agent)
-            self.grid.place_agent(agent, agent.pos)
+            self.add_agent(agent, agent.pos)
+
+    def animal_cells(self) -> tuple:
+        """Locate the animals on the grid.
+
+        Returns:
+            sheep_cells, sheep_sick, wolf_cells (tuple): the flat cell index
+                (x * grid_height + y) of each sheep, whether it is sick, and the
+                flat cell index of each wolf
+        """
+        sheep_cells = []
+        sheep_sick = []
+        wolf_cells = []
+        for agent in self.scheduler.agents:
+            pos_x, pos_y = agent.pos
+            if isinstance(agent, Sheep):
+                sheep_cells.append(pos_x * self.grid.height + pos_y)
+                sheep_sick.append(agent.is_sick)
+            elif isinstance(agent, Wolf):
+                wolf_cells.append(pos_x * self.grid.height + pos_y)
+        return (
+            np.array(sheep_cells, dtype=np.int64),
+            np.array(sheep_sick, dtype=bool),
+            np.array(wolf_cells, dtype=np.int64),
+        )
+
+    def population_row(self) -> tuple:
+        """Return the current populations and the sickness changes since the
+        previous row, then reset the latter."""
+        row = (*compute_population(self), self.nb_infections, self.nb_cures)
+        self.nb_infections = 0
+        self.nb_cures = 0
+        return row
+
+    def collect_population(self):
+        """Append the row of the current populations to the population series."""
+        self.population_series.append(self.population_row())
+
+    def step_phases(self) -> list:
+        """List the methods run by step(), in their order."""
+        return [
+            self.collect_population,
+            self.draw_random_numbers,
+            self.scheduler.step,
+            self.grass_field.step,
+            self.kill_agents,
+            self.give_birth_to_agents,
+        ]
 
     def step(self):
         """Handle a generic step for the whole model."""
-        self.datacollector.collect(self)
-        self.scheduler.step()
-        self.kill_agents()
-        self.give_birth_to_agents()
+        if self.profiler is None:
+            for phase in self.step_phases():
+                phase()
+        else:
+            self.profiler.run_phases(self.step_phases())
+
+    def save_checkpoint(self, checkpoint_path: Path):
+        """Save the full state of the model between two steps.
+
+        The checkpoint is a directory with the scalar state (config, step
+        counters, ...) in JSON and one .npy file per array: the grass timers,
+        the columns of the agents, the population series and the state of the
+        random generator. The agents are stored in the scheduler order, with
+        the order of the grid cell lists, so that the run resumes identically.
+        The directory is written aside and moved in place once complete, so an
+        interrupted save leaves the previous checkpoint intact.
+
+        Args:
+            checkpoint_path (Path): directory of the checkpoint
+        """
+        if self.died_agents or self.born_agents:
+            raise RuntimeError("A checkpoint can only be saved between two steps.")
+        checkpoint_path = Path(checkpoint_path)
+        tmp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        agents = self.scheduler.agents
+        species_codes = {Sheep: 0, Wolf: 1}
+        if any(type(agent) not in species_codes for agent in agents):
+            raise TypeError("Only the sheeps and the wolves can be checkpointed.")
+        agent_index = {agent: i for i, agent in enumerate(agents)}
+        grid_order = []
+        for pos in dict.fromkeys(agent.pos for agent in agents):
+            grid_order.extend(
+                agent_index[agent] for agent in self.grid.get_cell_list_contents(pos)
+            )
+        rng_version, rng_internal_state, rng_gauss_next = self.random.getstate()
+        arrays = {
+            "grass": self.grass_field.grass,
+            "count_no_grass": self.grass_field.count_no_grass,
+            "unique_id": np.array(
+                [agent.unique_id for agent in agents], dtype=np.int64
+            ),
+            "species": np.array(
+                [species_codes[type(agent)] for agent in agents], dtype=np.int8
+            ),
+            "pos": np.array([agent.pos for agent in agents], dtype=np.int64).reshape(
+                -1, 2
+            ),
+            "energy": np.array([agent.energy for agent in agents]),
+            "is_sick": np.array(
+                [isinstance(agent, Sheep) and agent.is_sick for agent in agents],
+                dtype=bool,
+            ),
+            "grid_order": np.array(grid_order, dtype=np.int64),
+            "series": self.population_series.view(),
+            "rng_state": np.array(rng_internal_state, dtype=np.uint32),
+        }
+        for name, array in arrays.items():
+            np.save(tmp_path / f"{name}.npy", array)
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "config": self.config.as_dict(),
+            "running": self.running,
+            "current_id": self.current_id,
+            "steps": self.scheduler.steps,
+            "time": self.scheduler.time,
+            "nb_grass": self.grass_field.nb_grass,
+            "nb_infections": self.nb_infections,
+            "nb_cures": self.nb_cures,
+            "series_start_step": self.population_series.start_step,
+            "series_nb_chunks": self.population_series.nb_chunks,
+            "rng_version": rng_version,
+            "rng_gauss_next": rng_gauss_next,
+            "numpy_rng_state": self.rng.bit_generator.state,
+        }
+        with open(
+            tmp_path / CHECKPOINT_STATE_FILE, "w", encoding="utf-8"
+        ) as state_file:
+            json.dump(state, state_file)
+        if checkpoint_path.exists():
+            old_path = checkpoint_path.with_name(checkpoint_path.name + ".old")
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(checkpoint_path, old_path)
+            os.replace(tmp_path, checkpoint_path)
+            shutil.rmtree(old_path)
+        else:
+            os.replace(tmp_path, checkpoint_path)
+
+    @classmethod
+    def load_checkpoint(
+        cls,
+        checkpoint_path: Path,
+        check_counters: bool = False,
+        population_series: Optional[PopulationSeries] = None,
+    ):
+        """Rebuild a model from a checkpoint written by save_checkpoint().
+
+        The arrays are memory-mapped and copied straight into the model, so
+        the checkpoint is never loaded in memory as a whole.
+
+        Args:
+            checkpoint_path (Path): directory of the checkpoint
+            check_counters (bool): see PreysPredatorsModel
+            population_series (PopulationSeries): series which receives the
+                saved rows and the next ones (a new in-memory one if None)
+
+        Returns:
+            model (PreysPredatorsModel): the model in the saved state
+        """
+        checkpoint_path = Path(checkpoint_path)
+        with open(
+            checkpoint_path / CHECKPOINT_STATE_FILE, "r", encoding="utf-8"
+        ) as state_file:
+            state = json.load(state_file)
+        if state["version"] != CHECKPOINT_VERSION:
+            raise ValueError(
+                f"Unsupported checkpoint version {state['version']}, "
+                f"expected {CHECKPOINT_VERSION}"
+            )
+
+        def load_array(name: str) -> np.ndarray:
+            return np.load(checkpoint_path / f"{name}.npy", mmap_mode="r")
+
+        config = ModelConfig(**state["config"])
+        # the initial population is replaced by the saved one
+        model = cls(
+            config.replace(init_nb_sheeps=0, init_nb_wolves=0),
+            check_counters=check_counters,
+            population_series=population_series,
+        )
+        model.config = config
+        model.running = state["running"]
+        model.current_id = state["current_id"]
+        model.scheduler.steps = state["steps"]
+        model.scheduler.time = state["time"]
+        np.copyto(model.grass_field.grass, load_array("grass"))
+        # the timers may have been saved with a wider integer type
+        model.grass_field.count_no_grass[...] = load_array("count_no_grass")
+        model.grass_field.nb_grass = state["nb_grass"]
+        model.nb_infections = state["nb_infections"]
+        model.nb_cures = state["nb_cures"]
+        model.population_series.restore(
+            load_array("series"), state["series_start_step"], state["series_nb_chunks"]
+        )
+        # add the agents to the scheduler in its order...
+        species_classes = (Sheep, Wolf)
+        agents = []
+        for unique_id, species, energy, is_sick in zip(
+            load_array("unique_id").tolist(),
+            load_array("species").tolist(),
+            load_array("energy").tolist(),
+            load_array("is_sick").tolist(),
+        ):
+            agent = species_classes[species](unique_id, model, energy)
+            if isinstance(agent, Sheep):
+                agent.is_sick = is_sick
+            model.scheduler.add(agent)
+            agents.append(agent)
+        # ... then on the grid in the order of the cell lists
+        positions = load_array("pos")
+        for i in load_array("grid_order").tolist():
+            agent = agents[i]
+            pos = tuple(positions[i].tolist())
+            model.grid.place_agent(agent, pos)
+            model.occupancy.place(agent, pos)
+            model.update_counters(agent, 1)
+        # the agents creation above draws random numbers: restore the state last
+        model.random.setstate(
+            (
+                state["rng_version"],
+                tuple(load_array("rng_state").tolist()),
+                state["rng_gauss_next"],
+            )
+        )
+        model.rng.bit_generator.state = state["numpy_rng_state"]
+        return model
+
+
+def count_sick_cellmates(
+    ranks: np.ndarray,
+    cells: np.ndarray,
+    start_cells: np.ndarray,
+    sick_before: np.ndarray,
+    sick_after: np.ndarray,
+) -> np.ndarray:
+    """Count the sick cellmates met by some sheeps when they update their sickness.
+
+    With the random activation, the sheeps activated before a sheep have
+    already moved and updated their sickness when it updates its own, while
+    the ones activated after it are still on the cell where they started the
+    step. All the sheeps have moved: each one sees the sheeps activated before
+    it on their cell, and the ones activated after it on their start cell.
+
+    Args:
+        ranks (np.ndarray): the increasing activation ranks of the sheeps,
+            which must include all the sick ones
+        cells (np.ndarray): the flat index of the cell of each sheep
+        start_cells (np.ndarray): the flat index of the start cell of each sheep
+        sick_before (np.ndarray): whether each sheep is sick for the sheeps
+            activated after it
+        sick_after (np.ndarray): whether each sheep is sick for the sheeps
+            activated before it
+
+    Returns:
+        nb_sick_cellmates (np.ndarray): the count of each sheep, itself excepted
+    """
+    # sorted (cell, activation rank) keys of the sick sheeps
+    nb_ranks = ranks[-1] + 1 if ranks.shape[0] else 0
+    first_keys = cells * nb_ranks
+    own_keys = first_keys + ranks
+    moved_keys = np.sort(own_keys[sick_before])
+    start_keys = np.sort((start_cells * nb_ranks + ranks)[sick_after])
+    nb_sick_before = np.searchsorted(moved_keys, own_keys) - np.searchsorted(
+        moved_keys, first_keys
+    )
+    nb_sick_after = np.searchsorted(
+        start_keys, first_keys + nb_ranks
+    ) - np.searchsorted(start_keys, own_keys, side="right")
+    return nb_sick_before + nb_sick_after
 
 
 def compute_population(model: PreysPredatorsModel):
-    """Count the number of sheeps, wolves and grass on the grid."""
+    """Return the number of sheeps, wolves, grass and sick sheeps on the grid."""
+    population = (
+        model.nb_sheeps,
+        model.nb_wolves,
+        model.grass_field.count_grass(),
+        model.nb_sheeps_sick,
+    )
+    if model.check_counters:
+        scanned_population = scan_population(model)
+        if population != scanned_population:
+            raise PopulationCountersError(population, scanned_population)
+    return population
+
+
+def scan_population(model: PreysPredatorsModel):
+    """Count the number of sheeps, wolves and grass on the grid with a full scan."""
     count_sheeps = 0
     count_wolves = 0
-    count_grass = 0
     count_sick = 0
     for agent in model.scheduler.agents:
         if isinstance(agent, Sheep):
@@ -397,6 +1131,5 @@ def compute_population(model: PreysPredatorsModel):
                 count_sick += 1
         elif isinstance(agent, Wolf):
             count_wolves += 1
-        elif isinstance(agent, Patch) and agent.grass:
-            count_grass += 1
+    count_grass = int(np.count_nonzero(model.grass_field.grass))
     return (count_sheeps, count_wolves, count_grass, count_sick)
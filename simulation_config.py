@@ -1,6 +1,34 @@
-"""Handle the simulation configuration."""
+"""Handle the simulation configuration.
+
+The parameters of the model are gathered in a ModelConfig, a frozen and
+validated object which the model reads with plain attribute lookups. It can
+be built from keyword arguments, from the environment variables (named after
+the parameters in upper case, e.g. GRID_WIDTH) or from a JSON or TOML file.
+"""
+import json
+import math
+import numbers
 import os
+from pathlib import Path
+from typing import Optional
 import numpy as np
+import simulation_constants as cons
+from custom_errors import ModelConfigError
+from staged_activation import ACTIVATIONS
+from sparse_grid import GRID_STORAGES
+
+TRUE_STRINGS = ("1", "true", "yes", "on")
+FALSE_STRINGS = ("0", "false", "no", "off")
+
+
+def parse_bool_string(value: str) -> bool:
+    """Convert a string such as "true" or "0" to a boolean."""
+    if value.lower() in TRUE_STRINGS:
+        return True
+    if value.lower() in FALSE_STRINGS:
+        return False
+    raise ValueError(f"Expected a boolean, got '{value}'")
+
 
 GRID_WIDTH = int(os.environ.get("GRID_WIDTH", default=40))
 GRID_HEIGHT = int(os.environ.get("GRID_HEIGHT", default=65))
@@ -20,7 +48,7 @@ WOLF_MOVE_LOSS = int(os.environ.get("WOLF_MOVE_LOSS", default=1))
 EMPTY_GRID = np.zeros((GRID_WIDTH, GRID_HEIGHT))
 # SICKNESS
 # add a sickness that is able to propagate among Sheep agents
-ADD_SICKNESS = os.environ.get("ADD_SICKNESS", default=False)
+ADD_SICKNESS = parse_bool_string(os.environ.get("ADD_SICKNESS", default="false"))
 # control the probability to die when infected by the above sickness
 SICKNESS_SEVERITY = float(os.environ.get("SICKNESS_SEVERITY", default=0.6))
 # control the probability of being infected by the illness when sharing a cell with an infected agent
@@ -32,5 +60,240 @@ SHEEP_SANITY_PROBA = float(os.environ.get("SHEEP_SANITY_PROBA", default=0.5))
 # control the probability for infected sheeps to recover from illness at each step
 SHEEP_CURE_PROBA = float(os.environ.get("SHEEP_CURE_PROBA", default=0.20))
 
+# SCHEDULER
+# "random": each agent runs its whole step in turn (original behaviour)
+# "staged": each stage of the step (move, eat, ...) runs over a whole species in turn
+# "compat": the staged scheduler stepping agent by agent, as "random" does
+ACTIVATION = os.environ.get("ACTIVATION", default="random")
+
+# GRID
+# "dense": the animals are stored in a list per cell (mesa.space.MultiGrid)
+# "sparse": only the occupied cells are stored, for grids of millions of cells
+GRID_STORAGE = os.environ.get("GRID_STORAGE", default="dense")
+
 # GUI
 EMPTY_GRID = np.zeros((GRID_WIDTH, GRID_HEIGHT))
+
+
+def create_model_default_config() -> dict:
+    """Create the default configuration of the model.
+
+    Returns:
+        model_config (dict): a dictionary containing all the default values of
+            the model parameters.
+    """
+    model_config = {}
+    model_config["init_nb_sheeps"] = cons.DEFAULT_INIT_NB_SHEEPS
+    model_config["init_nb_wolves"] = cons.DEFAULT_INIT_NB_WOLVES
+    model_config["grass_regrowth_time"] = cons.DEFAULT_GRASS_REGROWTH_TIME
+    model_config["grid_width"] = GRID_WIDTH
+    model_config["grid_height"] = GRID_HEIGHT
+    model_config["sheep_reproduction_rate"] = (
+        cons.DEFAULT_SHEEP_REPRODUCTION_RATE * cons.PERCENT_TO_PROBA
+    )
+    model_config["wolf_reproduction_rate"] = (
+        cons.DEFAULT_WOLF_REPRODUCTION_RATE * cons.PERCENT_TO_PROBA
+    )
+    model_config["sheep_gain_from_grass"] = cons.DEFAULT_SHEEP_GAIN_FROM_GRASS
+    model_config["wolf_gain_from_sheep"] = cons.DEFAULT_WOLF_GAIN_FROM_SHEEP
+    model_config["sheep_init_energy"] = SHEEP_INIT_ENERGY
+    model_config["wolf_init_energy"] = WOLF_INIT_ENERGY
+    model_config["sheep_move_loss"] = SHEEP_MOVE_LOSS
+    model_config["wolf_move_loss"] = WOLF_MOVE_LOSS
+    # Add the sickness config.
+    model_config["add_sickness"] = ADD_SICKNESS
+    model_config["sickness_severity"] = SICKNESS_SEVERITY
+    model_config["proba_sickness_transmission"] = PROBA_SICKNESS_TRANSMISSION
+    model_config["sheep_sanity_proba"] = SHEEP_SANITY_PROBA
+    model_config["sheep_cure_proba"] = SHEEP_CURE_PROBA
+    model_config["activation"] = ACTIVATION
+    model_config["grid_storage"] = GRID_STORAGE
+    return model_config
+
+
+def import_toml_parser():
+    """Import a TOML parser, which is only required to read TOML files."""
+    try:
+        import tomllib  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        try:
+            import tomli as tomllib  # pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            raise ImportError(
+                "Reading a TOML configuration requires Python 3.11+ or tomli."
+            ) from error
+    return tomllib
+
+
+def read_config_file(config_path: Path) -> dict:
+    """Read model parameters from a JSON or a TOML file."""
+    config_path = Path(config_path)
+    if config_path.suffix == ".toml":
+        tomllib = import_toml_parser()
+        with open(config_path, "rb") as config_file:
+            return tomllib.load(config_file)
+    with open(config_path, "r", encoding="utf-8") as config_file:
+        return json.load(config_file)
+
+
+# Kind of value of each model parameter, in the order of create_model_default_config()
+MODEL_CONFIG_FIELDS = {
+    "init_nb_sheeps": "count",
+    "init_nb_wolves": "count",
+    "grass_regrowth_time": "count",
+    "grid_width": "size",
+    "grid_height": "size",
+    "sheep_reproduction_rate": "probability",
+    "wolf_reproduction_rate": "probability",
+    "sheep_gain_from_grass": "number",
+    "wolf_gain_from_sheep": "number",
+    "sheep_init_energy": "number",
+    "wolf_init_energy": "number",
+    "sheep_move_loss": "number",
+    "wolf_move_loss": "number",
+    "add_sickness": "bool",
+    "sickness_severity": "probability",
+    "proba_sickness_transmission": "probability",
+    "sheep_sanity_proba": "probability",
+    "sheep_cure_proba": "probability",
+    "activation": "activation",
+    "grid_storage": "grid_storage",
+}
+
+# Valid values of the parameters which take one of a few strings
+CONFIG_CHOICES = {"activation": ACTIVATIONS, "grid_storage": GRID_STORAGES}
+
+
+def check_config_value(name: str, value):
+    """Check the value of a model parameter and return it.
+
+    The numbers may be NumPy scalars: they are returned as Python int or float.
+
+    Raises:
+        ModelConfigError: if the value has not the kind of the parameter
+    """
+    kind = MODEL_CONFIG_FIELDS[name]
+    is_integer = isinstance(value, numbers.Integral) and not isinstance(value, bool)
+    is_number = isinstance(value, numbers.Real) and not isinstance(value, bool)
+    if kind == "bool":
+        valid = isinstance(value, bool)
+    elif kind in CONFIG_CHOICES:
+        valid = value in CONFIG_CHOICES[kind]
+    elif kind in ("count", "size"):
+        valid = is_integer and value >= (1 if kind == "size" else 0)
+    elif kind == "probability":
+        valid = is_number and 0 <= value <= 1
+    else:
+        # the energies, gains and losses are finite and non-negative
+        valid = is_number and math.isfinite(value) and value >= 0
+    if not valid:
+        raise ModelConfigError(name, value, kind)
+    if is_integer:
+        return int(value)
+    if is_number:
+        return float(value)
+    return value
+
+
+def parse_config_string(name: str, value: str):
+    """Convert the string value of a parameter (e.g. from the environment)."""
+    kind = MODEL_CONFIG_FIELDS[name]
+    try:
+        if kind == "bool":
+            return parse_bool_string(value)
+        if kind in ("count", "size"):
+            return int(value)
+        if kind in ("probability", "number"):
+            number = float(value)
+            return int(number) if kind == "number" and number.is_integer() else number
+    except ValueError as error:
+        raise ModelConfigError(name, value, kind) from error
+    return value
+
+
+class ModelConfig:
+    """Frozen and validated parameters of the model.
+
+    The parameters are attributes (e.g. config.sheep_move_loss). A parameter
+    which is not given takes its value from create_model_default_config().
+    For compatibility with the dictionaries used before, config["name"],
+    keys() and dict(config) are supported as well.
+    """
+
+    __slots__ = tuple(MODEL_CONFIG_FIELDS)
+
+    def __init__(self, **values):
+        unknown_keys = set(values) - set(MODEL_CONFIG_FIELDS)
+        if unknown_keys:
+            raise ModelConfigError(sorted(unknown_keys))
+        default_values = create_model_default_config()
+        for name in MODEL_CONFIG_FIELDS:
+            value = values[name] if name in values else default_values[name]
+            object.__setattr__(self, name, check_config_value(name, value))
+
+    @classmethod
+    def from_env(cls, environ: Optional[dict] = None, **overrides):
+        """Build a config from the environment variables, e.g. GRID_WIDTH=50."""
+        environ = os.environ if environ is None else environ
+        values = {
+            name: parse_config_string(name, environ[name.upper()])
+            for name in MODEL_CONFIG_FIELDS
+            if name.upper() in environ
+        }
+        values.update(overrides)
+        return cls(**values)
+
+    @classmethod
+    def from_file(cls, config_path: Path, **overrides):
+        """Build a config from a JSON or a TOML file of parameters."""
+        values = read_config_file(config_path)
+        values.update(overrides)
+        return cls(**values)
+
+    @classmethod
+    def coerce(cls, config):
+        """Return a ModelConfig given a ModelConfig or a dictionary of parameters."""
+        return config if isinstance(config, cls) else cls(**config)
+
+    def replace(self, **changes):
+        """Return a copy of the config with some parameters changed."""
+        return ModelConfig(**{**self.as_dict(), **changes})
+
+    def as_dict(self) -> dict:
+        """Return the parameters as a (JSON serializable) dictionary."""
+        return {name: getattr(self, name) for name in MODEL_CONFIG_FIELDS}
+
+    def keys(self):
+        """Names of the parameters (makes dict(config) work)."""
+        return MODEL_CONFIG_FIELDS.keys()
+
+    def __getitem__(self, name: str):
+        if name not in MODEL_CONFIG_FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelConfig is frozen, use replace() instead")
+
+    def __delattr__(self, name):
+        raise AttributeError("ModelConfig is frozen")
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state: dict):
+        # used by pickle and copy, which bypass __init__()
+        for name in MODEL_CONFIG_FIELDS:
+            object.__setattr__(self, name, check_config_value(name, state[name]))
+
+    def __eq__(self, other):
+        if not isinstance(other, ModelConfig):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __hash__(self):
+        return hash(tuple(self.as_dict().items()))
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={value!r}" for name, value in self.as_dict().items())
+        return f"ModelConfig({values})"
@@ -1,6 +1,5 @@
 """Contain simulation constants."""
 from pathlib import Path
-import matplotlib as mpl
 
 PERCENT_TO_PROBA = 1 / 100
 SECOND_TO_MSECOND = 1000
@@ -50,6 +49,20 @@ MIN_WOLF_REPRODUCTION_RATE = 1
 # Maximal value of the wolves' reproduction rate (%)
 MAX_WOLF_REPRODUCTION_RATE = 20
 
+# Steps per second at the minimal model speed and just below the maximal one
+# (at the maximal speed, the model runs as fast as possible)
+MIN_STEPS_PER_SECOND = 1
+MAX_STEPS_PER_SECOND = 200
+# Delay between two refreshes of the plots (ms)
+FRAME_INTERVAL_MS = 40
+# Number of frames waiting to be displayed (the oldest ones are dropped)
+FRAME_QUEUE_SIZE = 2
+# Maximal number of points plotted per curve on the population plot
+MAX_PLOTTED_POINTS = 2000
+# Initial limits of the axes of the population plot
+INIT_POPULATION_PLOT_XMAX = 100
+INIT_POPULATION_PLOT_YMAX = 200
+
 # Sheeps image for the GUI
 ASCII_SHEEPS_PATH = Path("./assets/ascii_sheeps.png")
 
@@ -67,16 +80,14 @@ HEALTHY_SHEEP_COLOR = "white"
 SICK_SHEEP_COLOR = "yellow"
 GREEN_PATCH_COLOR = "green"
 BROWN_PATCH_COLOR = "brown"
-GRID_PLOT_CMAP = mpl.colors.ListedColormap(
-    [
-        EMPTY_CASE_COLOR,
-        WOLF_COLOR,
-        HEALTHY_SHEEP_COLOR,
-        GREEN_PATCH_COLOR,
-        BROWN_PATCH_COLOR,
-        SICK_SHEEP_COLOR,
-    ]
-)
+GRID_PLOT_COLORS = [
+    EMPTY_CASE_COLOR,
+    WOLF_COLOR,
+    HEALTHY_SHEEP_COLOR,
+    GREEN_PATCH_COLOR,
+    BROWN_PATCH_COLOR,
+    SICK_SHEEP_COLOR,
+]
 GRID_PLOT_CMAP_BOUNDS = [
     EMPTY_CASE - 0.5,
     EMPTY_CASE + 0.5,
@@ -86,9 +97,6 @@ GRID_PLOT_CMAP_BOUNDS = [
     BROWN_PATCH + 0.5,
     SICK_SHEEP + 0.5,
 ]
-GRID_PLOT_CMAP_NORM = mpl.colors.BoundaryNorm(
-    boundaries=GRID_PLOT_CMAP_BOUNDS, ncolors=GRID_PLOT_CMAP.N
-)
 GRID_PLOT_CBAR_TICKS = [
     EMPTY_CASE,
     WOLF,
@@ -1,18 +1,34 @@
 """GUI to run the simulation."""
+import contextlib
+import queue
 import time
 from typing import Optional
 import tkinter as tk
 from tkinter import messagebox
-from threading import Thread
+from threading import Event, Thread
 from PIL import ImageTk, Image
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.collections import PolyCollection
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 import numpy as np
-from sheep_wolves_grass import PreysPredatorsModel, Sheep, Wolf, Patch
+from sheep_wolves_grass import PreysPredatorsModel
+from grid_rasterizer import GridRasterizer
 import simulation_constants as cons
 import simulation_config as config
 
+GRID_PLOT_CMAP = mpl.colors.ListedColormap(cons.GRID_PLOT_COLORS)
+GRID_PLOT_CMAP_NORM = mpl.colors.BoundaryNorm(
+    boundaries=cons.GRID_PLOT_CMAP_BOUNDS, ncolors=GRID_PLOT_CMAP.N
+)
+# (label, color) of the curves of the population plot
+POPULATION_CURVES = [
+    ("Total number of sheeps", "blue"),
+    ("Number of wolves", "red"),
+    ("Grass / 4", "green"),
+    ("Number of sick sheeps", "black"),
+]
+
 
 class SimulationApp:
     """Application to simulate a prey-predator model."""
@@ -23,10 +39,21 @@ class SimulationApp:
             f"{self.window.winfo_screenwidth()}x{self.window.winfo_screenheight()}"
         )
         self.window.title("Preys Predators Simulation")
-        self.model_config = create_model_default_config()
+        self.model_config = config.create_model_default_config()
         self.model = PreysPredatorsModel(config=self.model_config)
+        # buffers of the grid plot, reused at each frame
+        self.rasterizer = GridRasterizer(config.GRID_WIDTH, config.GRID_HEIGHT)
+        # frames produced by the simulation thread, displayed by the Tk main loop
+        self.frames = queue.Queue(maxsize=cons.FRAME_QUEUE_SIZE)
+        # set by the Tk main loop when it is ready to display a new frame
+        self.frame_wanted = Event()
+        self.frame_wanted.set()
+        # None means as fast as possible (updated from the speed slider)
+        self.target_steps_per_second = None
+        self.simulation_thread = None
         self.create_widgets()
         self.window.protocol("WM_DELETE_WINDOW", self.on_exit)
+        self.window.after(cons.FRAME_INTERVAL_MS, self.render_latest_frame)
 
     def on_exit(self):
         """When you click to exit, this function is called"""
@@ -53,39 +80,78 @@ class SimulationApp:
         self.left_panel.pack(fill=tk.BOTH, side=tk.RIGHT)
 
     def run_model(self):
-        """Run the prey-predator model."""
-        count = 1
-        self.model.running = True
-        while self.model.running:
-            count += 1
-            self.model.step()
-            population_df = self.model.datacollector.get_model_vars_dataframe()
-            population = population_df["population"].to_numpy()
-            time_list = [i + 1 for i in range(population.shape[0])]
-            nb_sheeps = [pop[0] for pop in population]
-            nb_wolves = [pop[1] for pop in population]
-            nb_grass_over_four = [pop[2] // 4 for pop in population]
-            if self.model_config["add_sickness"]:
-                nb_sheeps_sick = [pop[3] for pop in population]
-                self.right_panel.update_population_plot(
-                    time_list=time_list,
-                    nb_sheeps=nb_sheeps,
-                    nb_wolves=nb_wolves,
-                    nb_grass_over_four=nb_grass_over_four,
-                    nb_sheeps_sick=nb_sheeps_sick,
-                )
-            else:
-                self.right_panel.update_population_plot(
-                    time_list=time_list,
-                    nb_sheeps=nb_sheeps,
-                    nb_wolves=nb_wolves,
-                    nb_grass_over_four=nb_grass_over_four,
-                )
-            population_matrix = self.compute_population_matrix()
+        """Run the prey-predator model (in the simulation thread).
+
+        After a step, a snapshot of the model is pushed into the frame queue
+        when the Tk main loop wants a new frame (see render_latest_frame), and
+        after the last step. The steps are paced to reach target_steps_per_second.
+        """
+        model = self.model
+        model.running = True
+        next_step_time = time.perf_counter()
+        while model.running:
+            model.step()
+            self.push_frame(model)
+            steps_per_second = self.target_steps_per_second
+            if steps_per_second is None:
+                # full speed
+                continue
+            # no catching up after a slow step
+            next_step_time = max(
+                next_step_time + 1 / steps_per_second, time.perf_counter()
+            )
+            time.sleep(max(0, next_step_time - time.perf_counter()))
+        # the model may have stopped between two frames
+        self.push_frame(model, force=True)
+
+    def push_frame(self, model, force: bool = False):
+        """Push a snapshot of the model into the frame queue.
+
+        The grid is only rasterized when the Tk main loop wants a new frame
+        (or when force is True): at full speed, most steps are never displayed.
+        The queue is bounded: when it is full, the oldest frame is dropped.
+        """
+        if not force and not self.frame_wanted.is_set():
+            return
+        self.frame_wanted.clear()
+        # the populations rows already written never change: a view is enough
+        frame = (
+            model.population_series.steps() + 1,
+            model.population_series.view(),
+            self.compute_population_matrix(model).copy(),
+            self.model_config["add_sickness"],
+        )
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                with contextlib.suppress(queue.Empty):
+                    self.frames.get_nowait()
+
+    def render_latest_frame(self):
+        """Display the newest frame of the queue (in the Tk main loop)."""
+        self.target_steps_per_second = speed_to_steps_per_second(
+            self.left_panel.model_speed.get()
+        )
+        frame = None
+        with contextlib.suppress(queue.Empty):
+            while True:
+                frame = self.frames.get_nowait()
+        if frame is not None:
+            time_list, population, population_matrix, add_sickness = frame
+            self.right_panel.update_population_plot(
+                time_list=time_list,
+                nb_sheeps=population[:, 0],
+                nb_wolves=population[:, 1],
+                nb_grass_over_four=population[:, 2] // 4,
+                nb_sheeps_sick=population[:, 3] if add_sickness else None,
+            )
             self.right_panel.update_grid_plot(population_matrix)
-            time.sleep((1 - self.left_panel.model_speed.get() * cons.PERCENT_TO_PROBA))
+        self.frame_wanted.set()
+        self.window.after(cons.FRAME_INTERVAL_MS, self.render_latest_frame)
 
-    def compute_population_matrix(self) -> np.ndarray:
+    def compute_population_matrix(self, model: PreysPredatorsModel) -> np.ndarray:
         """Compute the population of the grid.
 
         The population is computed to be displayed it on the grid plot.
@@ -93,44 +159,9 @@ class SimulationApp:
         Returns:
             population_matrix (np.ndarray): matrix of the grid population
         """
-        healthy_sheeps_matrix = np.zeros((config.GRID_WIDTH, config.GRID_HEIGHT))
-        sick_sheeps_matrix = np.zeros_like(healthy_sheeps_matrix)
-        wolves_matrix = np.zeros_like(healthy_sheeps_matrix)
-        grass_matrix = np.zeros_like(healthy_sheeps_matrix)
-        population_matrix = np.zeros_like(healthy_sheeps_matrix)
-        # Fill the population matrix
-        for cell in self.model.grid.coord_iter():
-            cell_content, pos_x, pos_y = cell
-            for agent in cell_content:
-                if isinstance(agent, Sheep):
-                    if self.model_config["add_sickness"] and agent.is_sick:
-                        sick_sheeps_matrix[pos_x, pos_y] += 1
-                    else:
-                        healthy_sheeps_matrix[pos_x, pos_y] += 1
-                elif isinstance(agent, Wolf):
-                    wolves_matrix[pos_x, pos_y] += 1
-                elif isinstance(agent, Patch) and agent.grass:
-                    grass_matrix[pos_x, pos_y] += 1
-            # Rules for the order of display on the grid plot
-            if sick_sheeps_matrix[pos_x, pos_y] and wolves_matrix[pos_x, pos_y]:
-                population_matrix[pos_x, pos_y] = cons.WOLF
-            elif healthy_sheeps_matrix[pos_x, pos_y] and wolves_matrix[pos_x, pos_y]:
-                population_matrix[pos_x, pos_y] = cons.WOLF
-            elif (
-                healthy_sheeps_matrix[pos_x, pos_y] and sick_sheeps_matrix[pos_x, pos_y]
-            ):
-                population_matrix[pos_x, pos_y] = cons.SICK_SHEEP
-            elif healthy_sheeps_matrix[pos_x, pos_y]:
-                population_matrix[pos_x, pos_y] = cons.HEALTHY_SHEEP
-            elif sick_sheeps_matrix[pos_x, pos_y]:
-                population_matrix[pos_x, pos_y] = cons.SICK_SHEEP
-            elif wolves_matrix[pos_x, pos_y]:
-                population_matrix[pos_x, pos_y] = cons.WOLF
-            elif grass_matrix[pos_x, pos_y]:
-                population_matrix[pos_x, pos_y] = cons.GREEN_PATCH
-            else:
-                population_matrix[pos_x, pos_y] = cons.BROWN_PATCH
-        return population_matrix
+        return self.rasterizer.rasterize(
+            model, show_sickness=self.model_config["add_sickness"]
+        )
 
     def run(self):
         """Run the simulation application."""
@@ -376,8 +407,13 @@ class ParametersFrame(tk.Frame):
         The model runs in a different thread so that the
         user can still change settings on the GUI.
         """
-        thread = Thread(target=self.app.run_model)
-        thread.start()
+        if (
+            self.app.simulation_thread is not None
+            and self.app.simulation_thread.is_alive()
+        ):
+            return
+        self.app.simulation_thread = Thread(target=self.app.run_model, daemon=True)
+        self.app.simulation_thread.start()
 
 
 class PlotsFrame(tk.Frame):
@@ -391,82 +427,120 @@ class PlotsFrame(tk.Frame):
         self.create_widgets()
 
     def init_population_plot(self):
-        """Initialize the population plot (at the bottom right of the GUI)."""
+        """Initialize the population plot (at the bottom right of the GUI).
+
+        The curves are persistent artists whose data is replaced at each frame.
+        They are drawn with blitting over a cached background (axes, ticks and
+        grid), which is only redrawn when the limits of the axes change.
+        """
         self.population_figure = plt.figure()
         self.pop_ax = self.population_figure.add_subplot()
-        self.pop_ax.plot(
-            [], [], label="Total number of sheeps", color="blue", linewidth=4
-        )
-        self.pop_ax.plot([], [], label="Number of wolves", color="red", linewidth=4)
-        self.pop_ax.plot([], [], label="Grass / 4", color="green", linewidth=4)
-        if self.app.model_config["add_sickness"]:
-            self.pop_ax.plot(
-                [], [], label="Number of sick sheeps", color="black", linewidth=4
+        self.population_curves = []
+        for label, color in POPULATION_CURVES:
+            (line,) = self.pop_ax.plot(
+                [], [], label=label, color=color, linewidth=4, animated=True
             )
+            area = PolyCollection([], facecolors=color, alpha=0.3, animated=True)
+            self.pop_ax.add_collection(area)
+            self.population_curves.append((line, area))
+        # the sick sheeps curve is only shown when the sickness is added
+        self.set_sick_curve_visible(self.app.model_config["add_sickness"])
+        self.pop_ax.set_xlim(0, cons.INIT_POPULATION_PLOT_XMAX)
+        self.pop_ax.set_ylim(0, cons.INIT_POPULATION_PLOT_YMAX)
         self.pop_ax.set_xlabel("Time (Number of steps)")
         self.pop_ax.set_ylabel("Population")
         self.pop_ax.grid()
-        self.pop_ax.legend()
+        self.pop_background = None
+
+    def set_sick_curve_visible(self, visible: bool):
+        """Show or hide the curve of the sick sheeps and update the legend."""
+        for artist in self.population_curves[-1]:
+            artist.set_visible(visible)
+        self.pop_legend = self.pop_ax.legend(
+            handles=[line for line, _ in self.population_curves if line.get_visible()]
+        )
+        self.pop_legend.set_animated(True)
+
+    def population_artists(self) -> list:
+        """List the artists of the population plot which change at each frame."""
+        artists = [artist for curve in self.population_curves for artist in curve]
+        return artists + [self.pop_legend]
+
+    def on_population_draw(self, _event):
+        """Cache the background of the population plot after a full redraw."""
+        self.pop_background = self.canvas_populations.copy_from_bbox(
+            self.population_figure.bbox
+        )
+        for artist in self.population_artists():
+            self.pop_ax.draw_artist(artist)
 
     def update_population_plot(
         self,
-        time_list: list,
-        nb_sheeps: list,
-        nb_wolves: list,
-        nb_grass_over_four: list,
-        nb_sheeps_sick: Optional[list] = None,
+        time_list: np.ndarray,
+        nb_sheeps: np.ndarray,
+        nb_wolves: np.ndarray,
+        nb_grass_over_four: np.ndarray,
+        nb_sheeps_sick: Optional[np.ndarray] = None,
     ):
         """Update the population plot with the latest data."""
-        self.pop_ax.clear()
-        self.pop_ax.plot(
-            time_list,
-            nb_sheeps,
-            label="Total number of sheeps",
-            color="blue",
-            linewidth=4,
-        )
-        self.pop_ax.fill_between(time_list, nb_sheeps, 0, color="blue", alpha=0.3)
-        self.pop_ax.plot(
-            time_list, nb_wolves, label="Number of wolves", color="red", linewidth=4
-        )
-        self.pop_ax.fill_between(time_list, nb_wolves, 0, color="red", alpha=0.3)
-        self.pop_ax.plot(
-            time_list, nb_grass_over_four, label="Grass /4", color="green", linewidth=4
-        )
-        self.pop_ax.fill_between(
-            time_list, nb_grass_over_four, 0, color="green", alpha=0.3
-        )
-        if nb_sheeps_sick:
-            self.pop_ax.plot(
-                time_list,
-                nb_sheeps_sick,
-                label="Number of sick sheeps",
-                color="black",
-                linewidth=4,
-            )
-            self.pop_ax.fill_between(
-                time_list, nb_sheeps_sick, 0, color="black", alpha=0.3
+        if (nb_sheeps_sick is not None) != self.population_curves[-1][0].get_visible():
+            self.set_sick_curve_visible(nb_sheeps_sick is not None)
+        # plot about MAX_PLOTTED_POINTS points per curve
+        stride = -(-len(time_list) // cons.MAX_PLOTTED_POINTS)
+        # the newest sample is always plotted
+        plotted = np.unique(np.r_[0 : len(time_list) : stride, len(time_list) - 1])
+        times = time_list[plotted]
+        populations = [nb_sheeps, nb_wolves, nb_grass_over_four, nb_sheeps_sick]
+        y_max = 0
+        for (line, area), population in zip(self.population_curves, populations):
+            if population is None:
+                continue
+            values = population[plotted]
+            line.set_data(times, values)
+            area.set_verts(
+                [
+                    np.column_stack(
+                        [
+                            np.concatenate([times, times[::-1]]),
+                            np.concatenate([values, np.zeros_like(values)]),
+                        ]
+                    )
+                ]
             )
-        self.pop_ax.set_xlabel("Time (number of steps)")
-        self.pop_ax.set_ylabel("Population")
-        self.pop_ax.grid()
-        self.pop_ax.legend()
-        self.canvas_populations.draw()
+            y_max = max(y_max, values.max())
+        x_limit = self.pop_ax.get_xlim()[1]
+        y_limit = self.pop_ax.get_ylim()[1]
+        if times[-1] > x_limit or y_max > y_limit or self.pop_background is None:
+            # the limits grow geometrically so that full redraws stay rare
+            while times[-1] > x_limit:
+                x_limit *= 2
+            if y_max > y_limit:
+                y_limit = 1.5 * y_max
+            self.pop_ax.set_xlim(0, x_limit)
+            self.pop_ax.set_ylim(0, y_limit)
+            # redraws everything, the background is cached by on_population_draw
+            self.canvas_populations.draw()
+        else:
+            self.canvas_populations.restore_region(self.pop_background)
+            for artist in self.population_artists():
+                self.pop_ax.draw_artist(artist)
+            self.canvas_populations.blit(self.population_figure.bbox)
 
     def init_grid_plot(self):
         """Initialize the grid plot."""
         self.grid_figure, self.gridfig_ax = plt.subplots(1)
-        # PLot an empty grid
-        self.gridfig_ax.matshow(
+        # PLot an empty grid, its data is replaced at each frame
+        self.grid_image = self.gridfig_ax.matshow(
             config.EMPTY_GRID,
-            cmap=cons.GRID_PLOT_CMAP,
-            norm=cons.GRID_PLOT_CMAP_NORM,
+            cmap=GRID_PLOT_CMAP,
+            norm=GRID_PLOT_CMAP_NORM,
+            animated=True,
         )
         self.gridfig_ax.set_title("Current state of the grid")
         self.gridfig_ax.axis("off")
         cbar = self.grid_figure.colorbar(
             mpl.cm.ScalarMappable(
-                cmap=cons.GRID_PLOT_CMAP, norm=cons.GRID_PLOT_CMAP_NORM
+                cmap=GRID_PLOT_CMAP, norm=GRID_PLOT_CMAP_NORM
             ),
             ax=self.gridfig_ax,
             ticks=cons.GRID_PLOT_CBAR_TICKS,
@@ -475,15 +549,16 @@ class PlotsFrame(tk.Frame):
             ["Empty", "Wolf", "Healthy sheep", "Grass", "Dirt", "Sick sheep"]
         )
 
+    def on_grid_draw(self, _event):
+        """Draw the grid image after a full redraw of the grid figure."""
+        self.gridfig_ax.draw_artist(self.grid_image)
+
     def update_grid_plot(self, population_matrix: np.ndarray):
         """Update the grid plot with the latest data."""
-        self.gridfig_ax.clear()
-        self.gridfig_ax.matshow(
-            population_matrix, cmap=cons.GRID_PLOT_CMAP, norm=cons.GRID_PLOT_CMAP_NORM
-        )
-        self.gridfig_ax.set_title("Current state of the grid")
-        self.gridfig_ax.axis("off")
-        self.canvas_grid.draw()
+        self.grid_image.set_data(population_matrix)
+        # the image covers the whole axes: no need to restore the background
+        self.gridfig_ax.draw_artist(self.grid_image)
+        self.canvas_grid.blit(self.gridfig_ax.bbox)
 
     def create_widgets(self):
         """Create the widgets on the plot panel."""
@@ -494,6 +569,7 @@ class PlotsFrame(tk.Frame):
         frame_down.pack(expand=True, fill=tk.BOTH)
         # Canvas and toolbar to plot the grid
         self.canvas_grid = FigureCanvasTkAgg(figure=self.grid_figure, master=frame_up)
+        self.canvas_grid.mpl_connect("draw_event", self.on_grid_draw)
         self.canvas_grid.draw()
         toolbar_grid = NavigationToolbar2Tk(self.canvas_grid, frame_up)
         toolbar_grid.update()
@@ -503,6 +579,7 @@ class PlotsFrame(tk.Frame):
         self.canvas_populations = FigureCanvasTkAgg(
             figure=self.population_figure, master=frame_down
         )
+        self.canvas_populations.mpl_connect("draw_event", self.on_population_draw)
         self.canvas_populations.draw()
         toolbar_populations = NavigationToolbar2Tk(self.canvas_populations, frame_down)
         toolbar_populations.update()
@@ -510,38 +587,21 @@ class PlotsFrame(tk.Frame):
         self.canvas_populations.get_tk_widget().pack(expand=True, fill=tk.BOTH)
 
 
-def create_model_default_config() -> dict:
-    """Create the default configuration of the model.
+def speed_to_steps_per_second(model_speed: int) -> Optional[float]:
+    """Convert the model speed (%) to a target number of steps per second.
 
-    Returns:
-        model_config (dict): a dictionary containing all the default values of
-            the model parameters.
+    The speed scale is geometric from MIN_STEPS_PER_SECOND at MIN_MODEL_SPEED
+    to MAX_STEPS_PER_SECOND just below MAX_MODEL_SPEED. At MAX_MODEL_SPEED,
+    the model runs as fast as possible and None is returned.
     """
-    model_config = {}
-    model_config["init_nb_sheeps"] = cons.DEFAULT_INIT_NB_SHEEPS
-    model_config["init_nb_wolves"] = cons.DEFAULT_INIT_NB_WOLVES
-    model_config["grass_regrowth_time"] = cons.DEFAULT_GRASS_REGROWTH_TIME
-    model_config["grid_width"] = config.GRID_WIDTH
-    model_config["grid_height"] = config.GRID_HEIGHT
-    model_config["sheep_reproduction_rate"] = (
-        cons.DEFAULT_SHEEP_REPRODUCTION_RATE * cons.PERCENT_TO_PROBA
-    )
-    model_config["wolf_reproduction_rate"] = (
-        cons.DEFAULT_WOLF_REPRODUCTION_RATE * cons.PERCENT_TO_PROBA
+    if model_speed >= cons.MAX_MODEL_SPEED:
+        return None
+    fraction = (model_speed - cons.MIN_MODEL_SPEED) / (
+        cons.MAX_MODEL_SPEED - 1 - cons.MIN_MODEL_SPEED
     )
-    model_config["sheep_gain_from_grass"] = cons.DEFAULT_SHEEP_GAIN_FROM_GRASS
-    model_config["wolf_gain_from_sheep"] = cons.DEFAULT_WOLF_GAIN_FROM_SHEEP
-    model_config["sheep_init_energy"] = config.SHEEP_INIT_ENERGY
-    model_config["wolf_init_energy"] = config.WOLF_INIT_ENERGY
-    model_config["sheep_move_loss"] = config.SHEEP_MOVE_LOSS
-    model_config["wolf_move_loss"] = config.WOLF_MOVE_LOSS
-    # Add the sickness config.
-    model_config["add_sickness"] = config.ADD_SICKNESS
-    model_config["sickness_severity"] = config.SICKNESS_SEVERITY
-    model_config["proba_sickness_transmission"] = config.PROBA_SICKNESS_TRANSMISSION
-    model_config["sheep_sanity_proba"] = config.SHEEP_SANITY_PROBA
-    model_config["sheep_cure_proba"] = config.SHEEP_CURE_PROBA
-    return model_config
+    return cons.MIN_STEPS_PER_SECOND * (
+        cons.MAX_STEPS_PER_SECOND / cons.MIN_STEPS_PER_SECOND
+    ) ** min(fraction, 1)
 
 
 def main():
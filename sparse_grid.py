@@ -0,0 +1,117 @@
+"""Store the animals of very large grids cell by cell, only where they are.
+
+mesa.space.MultiGrid allocates a list for every cell of the grid, so a
+5000x5000 grid takes gigabytes before any animal is placed. SparseMultiGrid
+has the same interface (the part of it used by the model) and the same
+toroidal semantics, but only stores the occupied cells: its memory grows with
+the number of animals, not with the area of the grid. SparseCounts does the
+same for the per-cell counts of the occupancy index.
+"""
+
+# Values of the "grid_storage" model parameter
+DENSE_GRID = "dense"
+SPARSE_GRID = "sparse"
+GRID_STORAGES = (DENSE_GRID, SPARSE_GRID)
+
+
+class SparseMultiGrid:
+    """Toroidal grid holding any number of agents per cell, stored in a dict.
+
+    The agents of a cell are kept in the order they entered it, as in
+    mesa.space.MultiGrid, and a cell left empty is deleted.
+    """
+
+    def __init__(self, width: int, height: int, torus: bool = True):
+        if not torus:
+            raise ValueError("SparseMultiGrid only supports toroidal grids.")
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.num_cells = width * height
+        # cells[pos] is the list of the agents at pos, for the occupied cells
+        self.cells = {}
+
+    def torus_adj(self, pos: tuple) -> tuple:
+        """Wrap a position around the torus."""
+        return pos[0] % self.width, pos[1] % self.height
+
+    def place_agent(self, agent, pos: tuple):
+        """Place an agent on a cell and set its pos attribute."""
+        cell = self.cells.setdefault(pos, [])
+        if agent not in cell:
+            cell.append(agent)
+        agent.pos = pos
+
+    def remove_agent(self, agent):
+        """Remove an agent from its cell and set its pos attribute to None."""
+        cell = self.cells[agent.pos]
+        cell.remove(agent)
+        if not cell:
+            del self.cells[agent.pos]
+        agent.pos = None
+
+    def move_agent(self, agent, pos: tuple):
+        """Move an agent from its current cell to another one."""
+        pos = self.torus_adj(pos)
+        self.remove_agent(agent)
+        self.place_agent(agent, pos)
+
+    def is_cell_empty(self, pos: tuple) -> bool:
+        """Return True if no agent is at pos."""
+        return pos not in self.cells
+
+    def get_cell_list_contents(self, cell_list) -> list:
+        """Return the agents of a cell or of a list of cells."""
+        if isinstance(cell_list, tuple) and len(cell_list) == 2:
+            cell_list = [cell_list]
+        return [agent for pos in cell_list for agent in self.cells.get(pos, ())]
+
+    def get_neighborhood(
+        self, pos: tuple, moore: bool, include_center: bool = False, radius: int = 1
+    ) -> list:
+        """Return the cells around a cell, in the order of MultiGrid.
+
+        As with MultiGrid on a torus, the neighbourhood is a Moore one (moore=True)
+        or a von Neumann one, and the radius is capped so that a cell reached
+        twice by wrapping around a narrow grid is only listed once. Unlike
+        MultiGrid, the neighbourhoods are not cached: the cache would grow with
+        the area of the grid.
+        """
+        if radius < 0:
+            raise ValueError(f"Expected a non-negative radius, got {radius}")
+        pos_x, pos_y = pos
+        max_radius_x, max_radius_y = self.width // 2, self.height // 2
+        radius_x, radius_y = min(radius, max_radius_x), min(radius, max_radius_y)
+        # on an even dimension, the offsets -max_radius and +max_radius reach
+        # the same cell: the last one is left out
+        end_x = radius_x + 1 - int(radius_x == max_radius_x and self.width % 2 == 0)
+        end_y = radius_y + 1 - int(radius_y == max_radius_y and self.height % 2 == 0)
+        neighbours = [
+            ((pos_x + offset_x) % self.width, (pos_y + offset_y) % self.height)
+            for offset_x in range(-radius_x, end_x)
+            for offset_y in range(-radius_y, end_y)
+            if moore or abs(offset_x) + abs(offset_y) <= radius
+        ]
+        if not include_center:
+            neighbours.remove(pos)
+        return neighbours
+
+
+class SparseCounts(dict):
+    """Counts per cell which only stores the cells with a non-zero count.
+
+    counts[pos] is 0 for a cell without entry, and setting a count to 0
+    deletes its entry, so that counts[pos] += 1 and counts[pos] -= 1 work as
+    with a NumPy array of counts.
+    """
+
+    __slots__ = ()
+
+    def __missing__(self, pos: tuple) -> int:
+        return 0
+
+    def __setitem__(self, pos: tuple, count: int):
+        if count:
+            super().__setitem__(pos, count)
+        else:
+            self.pop(pos, None)
@@ -0,0 +1,166 @@
+"""Check the staged and compat activations against the random activation."""
+import contextlib
+import io
+import types
+import unittest
+import numpy as np
+import batch_runner
+from activation_equivalence import compare_activations, equivalence_test
+from sheep_wolves_grass import PreysPredatorsModel
+from staged_activation import COMPAT_ACTIVATION, RANDOM_ACTIVATION
+
+# small grid on which the sickness spreads without the wolves dying out
+SMALL_SICK_CONFIG = {
+    "add_sickness": True,
+    "grid_width": 20,
+    "grid_height": 20,
+    "init_nb_sheeps": 80,
+    "init_nb_wolves": 20,
+}
+
+
+def run_populations(activation: str, seed: int, nb_steps: int) -> np.ndarray:
+    """Return the populations of a seeded run of the small sick grid."""
+    model_config = batch_runner.load_model_config(
+        overrides=dict(SMALL_SICK_CONFIG, activation=activation)
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        return batch_runner.run_simulation(model_config, nb_steps, seed).view()
+
+
+class StubSheep:  # pylint: disable=too-few-public-methods
+    """The attributes of a sheep read by run_epidemic()."""
+
+    def __init__(self, draw_slot: int, alive: bool, start_pos: tuple, pos: tuple):
+        self.draw_slot = draw_slot
+        self.alive = alive
+        self.start_pos = start_pos
+        self.pos = pos
+        self.energy = 1
+        self.is_sick = False
+
+
+def random_epidemic_state(rng: np.random.Generator, nb_sheeps: int) -> tuple:
+    """Build the sheeps of a step and a model stub able to run run_epidemic().
+
+    Returns:
+        model, sheeps, draws (tuple): the stub, the sheeps in their activation
+            order and the random numbers of the step
+    """
+    width, height = 4, 3
+    model = types.SimpleNamespace(tracer=None)
+    model.grid = types.SimpleNamespace(height=height)
+    model.config = types.SimpleNamespace(
+        sheep_cure_proba=rng.random(),
+        proba_sickness_transmission=rng.random(),
+        sickness_severity=0.0,
+    )
+    draws = {name: rng.random(nb_sheeps) for name in ("cure", "infection")}
+    draws["sickness_death"] = np.ones(nb_sheeps)
+    model.draws = types.SimpleNamespace(array=draws.__getitem__)
+
+    def set_sickness(sheep, is_sick: bool):
+        sheep.is_sick = is_sick
+
+    model.set_sickness = set_sickness
+    sheeps = []
+    for draw_slot in rng.permutation(nb_sheeps).tolist():
+        alive = bool(rng.random() < 0.9)
+        start_pos = (int(rng.integers(width)), int(rng.integers(height)))
+        pos = (int(rng.integers(width)), int(rng.integers(height)))
+        # the dead sheeps were eaten before moving
+        sheep = StubSheep(draw_slot, alive, start_pos, pos if alive else start_pos)
+        sheep.is_sick = bool(rng.random() < 0.4)
+        sheeps.append(sheep)
+    live_sheeps = {}
+    for sheep in sheeps:
+        if sheep.alive:
+            live_sheeps.setdefault(sheep.pos, {})[sheep] = None
+    model.occupancy = types.SimpleNamespace(live_sheeps=live_sheeps)
+    model.sheep_cells = lambda sheeps: PreysPredatorsModel.sheep_cells(model, sheeps)
+    model.sick_cell_ranks = lambda *args: PreysPredatorsModel.sick_cell_ranks(
+        model, *args
+    )
+    return model, sheeps, draws
+
+
+def step_epidemic(model, sheeps: list, draws: dict) -> list:
+    """Apply Sheep.update_sickness() sheep by sheep, as the random activation.
+
+    Returns:
+        is_sick (list): whether each sheep is sick at the end of the step
+    """
+    # the sheeps activated after a sheep have not moved yet
+    positions = [sheep.start_pos for sheep in sheeps]
+    is_sick = [sheep.is_sick for sheep in sheeps]
+    for i, sheep in enumerate(sheeps):
+        if not sheep.alive:
+            continue
+        positions[i] = sheep.pos
+        cure_draw = draws["cure"][sheep.draw_slot]
+        if is_sick[i] and cure_draw < model.config.sheep_cure_proba:
+            is_sick[i] = False
+        if not is_sick[i]:
+            has_sick_cellmate = any(
+                is_sick[j] and positions[j] == sheep.pos
+                for j in range(len(sheeps))
+                if j != i
+            )
+            is_sick[i] = (
+                has_sick_cellmate
+                and draws["infection"][sheep.draw_slot]
+                < model.config.proba_sickness_transmission
+            )
+    return is_sick
+
+
+class StagedActivationTest(unittest.TestCase):
+    """The batched stages of the staged activation follow the agent rules."""
+
+    def test_batched_epidemic_matches_sheep_steps(self):
+        rng = np.random.default_rng(0)
+        for state_index in range(300):
+            model, sheeps, draws = random_epidemic_state(rng, state_index % 40 + 1)
+            expected = step_epidemic(model, sheeps, draws)
+            PreysPredatorsModel.run_epidemic(model, sheeps)
+            self.assertEqual([sheep.is_sick for sheep in sheeps], expected)
+
+
+class CompatActivationTest(unittest.TestCase):
+    """The compat activation reproduces the random activation."""
+
+    def test_same_populations_as_random(self):
+        for seed in range(3):
+            np.testing.assert_array_equal(
+                run_populations(COMPAT_ACTIVATION, seed, 60),
+                run_populations(RANDOM_ACTIVATION, seed, 60),
+            )
+
+    def test_equivalence_check_with_sickness(self):
+        model_config = batch_runner.load_model_config(overrides=SMALL_SICK_CONFIG)
+        results = compare_activations(
+            model_config,
+            COMPAT_ACTIVATION,
+            nb_replicates=4,
+            nb_steps=60,
+            burn_in=20,
+            margin=0.1,
+            max_workers=1,
+        )
+        # the sickness columns are tested, not trivially equal
+        self.assertTrue(all(result["equivalent"] for result in results))
+
+
+class EquivalenceTestTest(unittest.TestCase):
+    """The populations which are zero in all the runs are not tested."""
+
+    def test_zero_column_not_tested(self):
+        reference = np.ones((5, 6))
+        reference[:, 4] = 0
+        results = equivalence_test(reference, reference.copy(), margin=0.1)
+        self.assertIsNone(results[4]["equivalent"])
+        self.assertTrue(results[0]["equivalent"])
+
+
+if __name__ == "__main__":
+    unittest.main()
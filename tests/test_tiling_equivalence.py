@@ -0,0 +1,44 @@
+"""Check the runs split by tiles against single staged runs."""
+import unittest
+import batch_runner
+from population_series import POPULATION_COLUMNS
+from tiling_equivalence import compare_tiling
+
+# grid with the sickness on which the wolves do not die out, cut in 8 tiles of
+# 5 columns: about a seventh of the sheeps cross a tile boundary at each step
+SMALL_SICK_CONFIG = {
+    "add_sickness": True,
+    "grid_width": 40,
+    "grid_height": 40,
+    "init_nb_sheeps": 200,
+    "init_nb_wolves": 40,
+    "wolf_reproduction_rate": 0.02,
+    "wolf_gain_from_sheep": 15,
+}
+
+
+class TilingEquivalenceTest(unittest.TestCase):
+    """A short seeded comparison, with a bound as coarse as its few replicates."""
+
+    def test_equivalence_check_with_sickness(self):
+        model_config = batch_runner.load_model_config(overrides=SMALL_SICK_CONFIG)
+        results, nb_migrating_sheeps = compare_tiling(
+            model_config,
+            nb_tiles=8,
+            nb_replicates=10,
+            nb_steps=80,
+            burn_in=30,
+            margin=0.4,
+            max_workers=1,
+        )
+        self.assertGreater(nb_migrating_sheeps, 10 * 80 * 10)
+        for result in results:
+            with self.subTest(population=result["population"]):
+                self.assertTrue(result["equivalent"])
+        # the comparison covers the epidemic
+        sick_result = results[POPULATION_COLUMNS.index("nb_sheeps_sick")]
+        self.assertGreater(sick_result["reference_mean"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Check that a run split by tiles gives the same populations as a single model.
+
+A TiledPreysPredatorsModel (see domain_decomposition.py) follows the staged
+activation, so it is compared with single PreysPredatorsModel runs of the
+staged activation over the same number of replicates, with the procedure of
+activation_equivalence.py: the populations are averaged over the steps
+following a burn-in period and the two samples of averages must be
+equivalent within +/- margin times the mean of the single model. The tiles
+draw other random numbers than a single model, so the samples are compared
+as independent ones.
+
+The tiles only differ from a single model at their boundaries, where the
+sick cellmates of the sheeps are counted differently. Without a
+configuration file, the comparison runs on a 100x100 grid with the sickness
+and enough animals for many sheeps to cross the boundaries at each step;
+the number of sheeps crossing a boundary is reported, and a comparison in
+which none crossed fails.
+
+Usage example:
+    python -m tiling_equivalence --tiles 4 --replicates 100 --steps 250
+
+The exit status is 1 when a population is not equivalent.
+"""
+import argparse
+import contextlib
+import io
+import sys
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import batch_runner
+from activation_equivalence import (
+    SICKNESS_SETTINGS,
+    collect_time_averages,
+    equivalence_test,
+    print_results,
+)
+from domain_decomposition import SPECIES_CLASSES, TiledPreysPredatorsModel
+from population_series import POPULATION_COLUMNS
+from sheep_wolves_grass import Sheep
+from staged_activation import STAGED_ACTIVATION
+
+# pylint: disable=consider-using-f-string
+
+# model parameters used without a configuration file: with 4 tiles, about 3% of
+# the sheeps cross a tile boundary at each step
+DEFAULT_MODEL_PARAMETERS = {
+    "add_sickness": True,
+    "grid_width": 100,
+    "grid_height": 100,
+    "init_nb_sheeps": 600,
+    "init_nb_wolves": 300,
+}
+
+
+def run_tiled(
+    model_config: dict, nb_steps: int, seed: int, nb_tiles: Optional[int]
+) -> tuple:
+    """Run the model split by tiles.
+
+    Returns:
+        populations (np.ndarray): one row per step, one column per population
+        nb_migrating_sheeps (int): number of times a sheep changed tile
+    """
+    with contextlib.redirect_stdout(io.StringIO()), TiledPreysPredatorsModel(
+        model_config, seed, nb_tiles=nb_tiles
+    ) as model:
+        model.running = True
+        for _ in range(nb_steps):
+            model.step()
+        model.collect_population()
+        nb_migrating_sheeps = model.nb_migrants[SPECIES_CLASSES.index(Sheep)]
+        return model.population_series.view().copy(), nb_migrating_sheeps
+
+
+def compare_tiling(
+    model_config: dict,
+    nb_tiles: Optional[int],
+    nb_replicates: int,
+    nb_steps: int,
+    burn_in: int,
+    margin: float,
+    max_workers: Optional[int] = None,
+) -> tuple:
+    """Run single staged models and tiled ones over the same seeds.
+
+    Returns:
+        results (list): the comparison of the populations (see equivalence_test())
+        nb_migrating_sheeps (int): number of times a sheep changed tile, over
+            all the tiled runs
+    """
+    reference = collect_time_averages(
+        STAGED_ACTIVATION,
+        model_config,
+        nb_replicates,
+        nb_steps,
+        burn_in,
+        max_workers,
+    )
+    # the replicates run one after the other, each one uses a process per tile
+    candidate = []
+    nb_migrating_sheeps = 0
+    for seed in range(nb_replicates):
+        populations, nb_migrants = run_tiled(model_config, nb_steps, seed, nb_tiles)
+        candidate.append(populations[burn_in:].mean(axis=0))
+        nb_migrating_sheeps += nb_migrants
+    results = equivalence_test(reference, np.array(candidate), margin, paired=False)
+    return results, nb_migrating_sheeps
+
+
+def main(argv: Optional[list] = None):
+    """Entry point of the equivalence test."""
+    parser = argparse.ArgumentParser(
+        description="Compare the runs split by tiles with single model runs."
+    )
+    parser.add_argument(
+        "--tiles", type=int, default=4, help="number of tiles (at least 2)"
+    )
+    parser.add_argument(
+        "--sickness",
+        choices=sorted(SICKNESS_SETTINGS),
+        default="on",
+        help="compare the runs with the sickness, without it, or both",
+    )
+    parser.add_argument("--replicates", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument(
+        "--burn-in", type=int, default=50, help="first steps left out of the averages"
+    )
+    parser.add_argument(
+        "--margin",
+        type=float,
+        default=0.1,
+        help="equivalence bound, relative to the mean of the single model",
+    )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=None,
+        help="JSON file of model parameters (a 100x100 grid with the sickness by "
+        "default)",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.burn_in >= args.steps:
+        parser.error("--burn-in must be smaller than --steps")
+    if args.tiles < 2:
+        parser.error("--tiles must be at least 2, a single tile has no boundary")
+    if args.config is None:
+        model_config = batch_runner.load_model_config(
+            overrides=DEFAULT_MODEL_PARAMETERS
+        )
+    else:
+        model_config = batch_runner.load_model_config(args.config)
+    all_equivalent = True
+    for add_sickness in SICKNESS_SETTINGS[args.sickness]:
+        print("[Equivalence] Sickness added: {}".format(add_sickness))
+        results, nb_migrating_sheeps = compare_tiling(
+            dict(model_config, add_sickness=add_sickness),
+            args.tiles,
+            args.replicates,
+            args.steps,
+            args.burn_in,
+            args.margin,
+            args.workers,
+        )
+        migrations_per_step = nb_migrating_sheeps / (args.replicates * args.steps)
+        sheeps_result = results[POPULATION_COLUMNS.index("nb_sheeps")]
+        print(
+            "[Equivalence] Sheeps crossing a tile boundary: {:.1f} per step "
+            "({:.1%} of the sheeps)".format(
+                migrations_per_step,
+                migrations_per_step / max(sheeps_result["candidate_mean"], 1),
+            )
+        )
+        if nb_migrating_sheeps == 0:
+            print("[Equivalence] No sheep crossed a tile boundary: nothing was tested")
+            all_equivalent = False
+        if not print_results(results, "single", "tiled"):
+            all_equivalent = False
+    if not all_equivalent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()